@@ -0,0 +1,154 @@
+"""
+Admission control for the API.
+
+Every ``/api`` request is put in a traffic class:
+
+* ``admin``  — bearer token carrying the ``is_admin`` claim
+* ``auth``   — the login/verify endpoints
+* ``public`` — everything else (landing-page route reads)
+
+Non-admin classes are rate limited per client with a token bucket (429 when
+empty), and every class has its own concurrency limit (503 when full). The
+limits default to shares of the worker's ``GUNICORN_THREADS`` that leave
+``ADMISSION_ADMIN_RESERVED`` threads free, so a burst of public reads can
+never take the threads admin CRUD needs. Admin
+requests may wait briefly for a slot; the others are rejected immediately so
+the latency of the requests we do accept stays bounded. Rejections carry a
+``Retry-After`` header.
+
+Limits are per worker process.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from flask import g, request
+
+MAX_TRACKED_CLIENTS = 10000
+
+
+class TrafficClass:
+    def __init__(self, name, rate, burst, concurrency, wait):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.wait = wait
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+
+
+class AdmissionController:
+    def __init__(self):
+        self.classes = {}
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        env = os.getenv
+        # Slots only bite below the worker's thread count (same setting as
+        # gunicorn.conf.py). Public and auth together get at most threads
+        # minus the admin reserve, so admin CRUD always finds a free thread.
+        threads = int(env("GUNICORN_THREADS", 4))
+        shared = max(2, threads - int(env("ADMISSION_ADMIN_RESERVED", 1)))
+        auth_slots = max(1, shared // 4)
+        self.classes = {
+            "public": TrafficClass(
+                "public",
+                rate=float(env("ADMISSION_PUBLIC_RATE", 10)),
+                burst=float(env("ADMISSION_PUBLIC_BURST", 30)),
+                concurrency=int(env("ADMISSION_PUBLIC_CONCURRENCY", shared - auth_slots)),
+                wait=0,
+            ),
+            "auth": TrafficClass(
+                "auth",
+                rate=float(env("ADMISSION_AUTH_RATE", 2)),
+                burst=float(env("ADMISSION_AUTH_BURST", 10)),
+                concurrency=int(env("ADMISSION_AUTH_CONCURRENCY", auth_slots)),
+                wait=0,
+            ),
+            "admin": TrafficClass(
+                "admin",
+                rate=0,
+                burst=0,
+                concurrency=int(env("ADMISSION_ADMIN_CONCURRENCY", threads)),
+                wait=float(env("ADMISSION_ADMIN_WAIT", 0.5)),
+            ),
+        }
+        self.secret = app.config["SECRET_KEY"]
+
+        @app.before_request
+        def _admit():
+            if request.method == "OPTIONS" or not request.path.startswith("/api/"):
+                return None
+            return self.admit()
+
+        @app.teardown_request
+        def _release(exc):
+            traffic = g.pop("admission_class", None)
+            if traffic is not None:
+                traffic.slots.release()
+
+    # ── Classification ──────────────────────
+    def classify(self) -> TrafficClass:
+        token = request.headers.get("Authorization", "")
+        if token.startswith("Bearer "):
+            try:
+                claims = jwt.decode(token.split(" ", 1)[1], self.secret, algorithms=["HS256"])
+                if claims.get("is_admin"):
+                    return self.classes["admin"]
+            except jwt.InvalidTokenError:
+                pass
+        if request.path.startswith("/api/auth"):
+            return self.classes["auth"]
+        return self.classes["public"]
+
+    def client_key(self) -> str:
+        # Resolved by ProxyFix from the trusted hops only (see TRUSTED_PROXY_HOPS)
+        return request.remote_addr or ""
+
+    # ── Admission ───────────────────────────
+    def admit(self):
+        traffic = self.classify()
+
+        if traffic.rate > 0:
+            wait = self._take_token(traffic, self.client_key())
+            if wait:
+                return self._reject(429, "Too many requests", wait)
+
+        if traffic.slots is not None:
+            if traffic.wait:
+                acquired = traffic.slots.acquire(timeout=traffic.wait)
+            else:
+                acquired = traffic.slots.acquire(blocking=False)
+            if not acquired:
+                return self._reject(503, "Server busy", 1)
+            g.admission_class = traffic
+        return None
+
+    def _take_token(self, traffic, client) -> float:
+        """Spend one token; return 0, or seconds until a token is available"""
+        now = time.monotonic()
+        key = (traffic.name, client)
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (traffic.burst, now))
+            tokens = min(traffic.burst, tokens + (now - last) * traffic.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / traffic.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        return wait
+
+    @staticmethod
+    def _reject(status, message, retry_after):
+        retry_after = max(1, math.ceil(retry_after))
+        return {"message": message, "retry_after": retry_after}, status, {"Retry-After": str(retry_after)}
+
+
+admission = AdmissionController()
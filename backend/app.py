@@ -1,12 +1,29 @@
+import math
 import os
-from flask import Flask, request, jsonify
+import uuid
+from flask import Flask, request
 from flask_migrate import Migrate
 from dotenv import load_dotenv
-from models import db, User, Route, VehicleTypeEnum
+from models import db, User, Route, Place, AuditEvent, VehicleTypeEnum
+from cache_bus import cache_bus
+from replica import replica_router, REPLICA_BIND
+from fare_matrix import fare_matrix, FARE_CLASSES
+from sync import MAX_VERSION, route_changes, compact_tombstones
+from places import nearest_places
+from audit import audit_log, record, snapshot, update_returning
+from admission import admission
+from slow_queries import slow_queries
+from warmup import warmup
+from profiling import profiler, to_collapsed, to_speedscope
+from fare_versions import FARE_FIELDS, fare_timeline, parse_as_of, add_fare_version, fare_history, apply_due_fares, apply_fares_if_due
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 import jwt
+import numpy as np
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import func
+from sqlalchemy import func, insert, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 from flask_restx import Api, Namespace, Resource, fields
 from flask_cors import CORS
 from functools import wraps
@@ -21,6 +38,31 @@ def build_db_url(raw_url: str) -> str:
         return raw_url.replace("@@", "%40@")
     return raw_url
 
+MAX_QUOTE_BATCH = 10000
+MAX_NEAREST_PLACES = 50
+
+def parse_uuid(value: str):
+    """Return a UUID, or None for ids that can't match any row"""
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+def valid_coordinates(lat: float, lng: float) -> bool:
+    """Finite and within ±90° latitude / ±180° longitude"""
+    return math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180
+
+def unique_violation(error: IntegrityError, columns) -> str:
+    """Name the unique column an INSERT/UPDATE collided on, if any"""
+    diag = getattr(error.orig, "diag", None)
+    if diag is not None:
+        # psycopg2: match the constraint name, never the message (it quotes the values)
+        detail = diag.constraint_name or ""
+    else:
+        # SQLite: "UNIQUE constraint failed: users.email"
+        detail = str(error.orig)
+    return next((column for column in columns if column in detail), None)
+
 # ── JWT Token Verification Decorator ────
 def token_required(f):
     @wraps(f)
@@ -28,52 +70,62 @@ def token_required(f):
         token = request.headers.get('Authorization')
         
         if not token:
-            return jsonify({'message': 'Token is missing'}), 401
+            return {'message': 'Token is missing'}, 401
         
         try:
             if token.startswith('Bearer '):
                 token = token.split(' ')[1]
             
             data = jwt.decode(token, os.getenv("SECRET_KEY", "fallback-secret"), algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
+            user_uuid = parse_uuid(str(data.get('user_id')))
+            current_user = db.session.get(User, user_uuid) if user_uuid else None
             
             if not current_user:
-                return jsonify({'message': 'User not found'}), 401
+                return {'message': 'User not found'}, 401
                 
         except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
+            return {'message': 'Token has expired'}, 401
         except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+            return {'message': 'Invalid token'}, 401
         
-        return f(current_user, *args, **kwargs)
+        return f(*args, current_user, **kwargs)
     
     return decorated
 
 # ── Admin Required Decorator ────
-def admin_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
+def authenticate_admin():
+    """Return (admin_user, None) for an admin bearer token, else (None, error response)"""
+    token = request.headers.get('Authorization')
+    
+    if not token:
+        return None, ({'message': 'Token is missing'}, 401)
+    
+    try:
+        if token.startswith('Bearer '):
+            token = token.split(' ')[1]
         
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
+        data = jwt.decode(token, os.getenv("SECRET_KEY", "fallback-secret"), algorithms=["HS256"])
+        user_uuid = parse_uuid(str(data.get('user_id')))
+        current_user = db.session.get(User, user_uuid) if user_uuid else None
         
-        try:
-            if token.startswith('Bearer '):
-                token = token.split(' ')[1]
+        if not current_user or not current_user.is_admin:
+            return None, ({'message': 'Admin access required'}, 403)
             
-            data = jwt.decode(token, os.getenv("SECRET_KEY", "fallback-secret"), algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
-            
-            if not current_user or not current_user.is_admin:
-                return jsonify({'message': 'Admin access required'}), 403
-                
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+    except jwt.ExpiredSignatureError:
+        return None, ({'message': 'Token has expired'}, 401)
+    except jwt.InvalidTokenError:
+        return None, ({'message': 'Invalid token'}, 401)
+    
+    return current_user, None
+
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        current_user, error = authenticate_admin()
+        if error:
+            return error
         
-        return f(current_user, *args, **kwargs)
+        return f(*args, current_user, **kwargs)
     
     return decorated
 
@@ -81,12 +133,18 @@ def admin_required(f):
 def create_app():
     app = Flask(__name__)
 
+    # remote_addr is the address our own proxies saw, never a client-supplied
+    # X-Forwarded-For entry; set to 0 when nothing sits in front of the app
+    proxy_hops = int(os.getenv("TRUSTED_PROXY_HOPS", 1))
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
     CORS(app, resources={
         r"/api/*": {
             "origins": ["https://lagona.vercel.app", "http://localhost:5173", "http://localhost:3000"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "expose_headers": ["Content-Type"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Primary-Until", "X-Profile"],
+            "expose_headers": ["Content-Type", "Retry-After", "X-Primary-Until", "X-Profile-Id"],
             "supports_credentials": True
         }
     })
@@ -96,8 +154,27 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "fallback-secret")
 
+    # Registered first so rejected requests skip all other work
+    admission.init_app(app)
+
+    replica_url = build_db_url(os.getenv("REPLICA_URL"))
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: replica_url}
+
     db.init_app(app)
     migrate.init_app(app, db)
+    cache_bus.init_app(app, db)
+    replica_router.init_app(app, db)
+    audit_log.init_app(app)
+    slow_queries.init_app(app, db)
+    # X-Profile requests pass the same admin check as admin_required
+    profiler.init_app(app, authorize=lambda: authenticate_admin()[0] is not None)
+
+    @app.before_request
+    def _apply_due_fares():
+        # Scheduled tariffs take effect on the first read after effective_from
+        if request.path.startswith(("/api/routes", "/api/fares")):
+            apply_fares_if_due()
 
     # ── RESTX / Swagger setup ──────────────
     api = Api(
@@ -107,6 +184,7 @@ def create_app():
         description="API documentation for testing endpoints",
         doc="/docs",
     )
+    warmup.init_app(app, db, api)
 
     # ── MODELS ─────────────────────────────
     user_model = api.model("User", {
@@ -153,6 +231,31 @@ def create_app():
         "description": fields.String(example="via main highway"),
     })
 
+    fare_version_model = api.model("FareVersion", {
+        "fare": fields.Float(required=True, example=100.0),
+        "regular": fields.Float(example=100.0),
+        "discount": fields.Float(example=80.0),
+        "special": fields.Float(example=115.0),
+        "effective_from": fields.DateTime(required=True, example="2026-12-01T00:00:00+08:00"),
+    })
+
+    fare_quote_item_model = api.model("FareQuoteItem", {
+        "origin": fields.String(required=True, example="Laguna"),
+        "destination": fields.String(required=True, example="Manila"),
+        "vehicle_type": fields.String(required=True, example="jeep"),
+        "fare_class": fields.String(example="regular", enum=list(FARE_CLASSES)),
+    })
+
+    fare_quote_model = api.model("FareQuote", {
+        "quotes": fields.List(fields.Nested(fare_quote_item_model), required=True),
+    })
+
+    place_model = api.model("Place", {
+        "name": fields.String(required=True, example="Laguna"),
+        "lat": fields.Float(required=True, example=14.2691),
+        "lng": fields.Float(required=True, example=121.4113),
+    })
+
     # ── AUTH Namespace ─────────────────────
     auth_ns = Namespace("auth", description="Authentication operations")
 
@@ -303,29 +406,37 @@ def create_app():
                 
                 if not data.get("username") or not data.get("email") or not data.get("password"):
                     return {"message": "Username, email, and password are required"}, 400
-                
-                if User.query.filter_by(username=data["username"]).first():
-                    return {"message": "Username already exists"}, 400
-                
-                if User.query.filter_by(email=data["email"]).first():
-                    return {"message": "Email already exists"}, 400
 
-                new_user = User(
-                    username=data["username"],
-                    email=data["email"],
-                    hashed_password=generate_password_hash(data["password"]),
-                    is_admin=data.get("is_admin", False),
-                )
-                db.session.add(new_user)
-                db.session.commit()
+                # Uniqueness is left to the users constraints: one INSERT ... RETURNING
+                new_user = db.session.execute(
+                    insert(User).values(
+                        username=data["username"],
+                        email=data["email"],
+                        hashed_password=generate_password_hash(data["password"]),
+                        is_admin=data.get("is_admin", False),
+                    ).returning(User)
+                ).scalar_one()
+                record(db.session, User, "insert", after=snapshot(new_user))
                 
-                return {
+                result = {
                     "id": str(new_user.id),
                     "username": new_user.username,
                     "email": new_user.email,
                     "is_admin": new_user.is_admin,
                     "is_active": new_user.is_active
-                }, 201
+                }
+                db.session.commit()
+                
+                return result, 201
+
+            except IntegrityError as e:
+                db.session.rollback()
+                if unique_violation(e, ("username",)):
+                    return {"message": "Username already exists"}, 400
+                if unique_violation(e, ("email",)):
+                    return {"message": "Email already exists"}, 400
+                print(f"Error in POST /api/users: {str(e)}")
+                return {"message": "Internal server error", "error": str(e)}, 500
                 
             except Exception as e:
                 print(f"Error in POST /api/users: {str(e)}")
@@ -356,35 +467,51 @@ def create_app():
         def put(self, user_id):
             """Update a user"""
             try:
-                user = User.query.get(user_id)
-                if not user:
+                user_uuid = parse_uuid(user_id)
+                if not user_uuid:
                     return {"message": "User not found"}, 404
                 
                 data = request.get_json()
                 
-                if data.get("username") and data["username"] != user.username:
-                    if User.query.filter_by(username=data["username"]).first():
-                        return {"message": "Username already exists"}, 400
-                
-                if data.get("email") and data["email"] != user.email:
-                    if User.query.filter_by(email=data["email"]).first():
-                        return {"message": "Email already exists"}, 400
-                
-                user.username = data.get("username", user.username)
-                user.email = data.get("email", user.email)
+                changes = {
+                    key: data[key]
+                    for key in ("username", "email", "is_admin")
+                    if key in data
+                }
                 if data.get("password"):
-                    user.hashed_password = generate_password_hash(data["password"])
-                user.is_admin = data.get("is_admin", user.is_admin)
+                    changes["hashed_password"] = generate_password_hash(data["password"])
                 
-                db.session.commit()
+                if changes:
+                    # One UPDATE ... RETURNING; uniqueness is left to the users constraints
+                    user, before = update_returning(User, [User.id == user_uuid], changes)
+                    if user:
+                        record(db.session, User, "update", before=before, after=snapshot(user))
+                else:
+                    user = db.session.get(User, user_uuid)
                 
-                return {
+                if not user:
+                    db.session.rollback()
+                    return {"message": "User not found"}, 404
+                
+                result = {
                     "id": str(user.id),
                     "username": user.username,
                     "email": user.email,
                     "is_admin": user.is_admin,
                     "is_active": user.is_active
-                }, 200
+                }
+                db.session.commit()
+                
+                return result, 200
+
+            except IntegrityError as e:
+                db.session.rollback()
+                if unique_violation(e, ("username",)):
+                    return {"message": "Username already exists"}, 400
+                if unique_violation(e, ("email",)):
+                    return {"message": "Email already exists"}, 400
+                print(f"Error in PUT /api/users/{user_id}: {str(e)}")
+                return {"message": "Internal server error", "error": str(e)}, 500
                 
             except Exception as e:
                 print(f"Error in PUT /api/users/{user_id}: {str(e)}")
@@ -394,11 +521,15 @@ def create_app():
         def delete(self, user_id):
             """Delete a user"""
             try:
-                user = User.query.get(user_id)
-                if not user:
+                user_uuid = parse_uuid(user_id)
+                deleted = user_uuid and db.session.execute(
+                    delete(User).where(User.id == user_uuid).returning(*User.__table__.c)
+                ).mappings().one_or_none()
+                if not deleted:
+                    db.session.rollback()
                     return {"message": "User not found"}, 404
+                record(db.session, User, "delete", before=snapshot(deleted))
                 
-                db.session.delete(user)
                 db.session.commit()
                 return {"message": "User deleted successfully"}, 200
             except Exception as e:
@@ -430,6 +561,14 @@ def create_app():
                 except ValueError:
                     return {"message": "page and limit must be integers"}, 400
 
+                # ── Fares in effect at a past/future time ──
+                as_of = None
+                if request.args.get('as_of'):
+                    try:
+                        as_of = parse_as_of(request.args['as_of'])
+                    except ValueError:
+                        return {"message": "as_of must be an ISO 8601 timestamp"}, 400
+
                 query = Route.query.filter_by(is_active=True)
 
                 # ── Vehicle type filter ────────────────
@@ -454,8 +593,13 @@ def create_app():
                 routes = query.offset((page - 1) * limit).limit(limit).all()
                 pages  = (total + limit - 1) // limit  # ceiling division
 
+                data = [route.to_dict() for route in routes]
+                if as_of:
+                    timeline = fare_timeline.get()
+                    data = [timeline.apply(route, as_of) for route in data]
+
                 return {
-                    "data": [route.to_dict() for route in routes],
+                    "data": data,
                     "pagination": {
                         "page":     page,
                         "limit":    limit,
@@ -482,34 +626,66 @@ def create_app():
                 if data["vehicle_type"] not in {v.value for v in VehicleTypeEnum}:
                     return {"message": "Invalid vehicle_type"}, 400
                 
-                new_route = Route(
-                    origin=data["origin"],
-                    destination=data["destination"],
-                    fare=data["fare"],
-                    regular=data.get("regular", 0.0),
-                    discount=data.get("discount", 0.0),
-                    special=data.get("special", 0.0),
-                    vehicle_type=VehicleTypeEnum(data["vehicle_type"]),
-                    description=data.get("description"),
-                )
-                db.session.add(new_route)
+                new_route = db.session.execute(
+                    insert(Route).values(
+                        origin=data["origin"],
+                        destination=data["destination"],
+                        fare=data["fare"],
+                        regular=data.get("regular", 0.0),
+                        discount=data.get("discount", 0.0),
+                        special=data.get("special", 0.0),
+                        vehicle_type=VehicleTypeEnum(data["vehicle_type"]),
+                        description=data.get("description"),
+                    ).returning(Route)
+                ).scalar_one()
+                record(db.session, Route, "insert", after=snapshot(new_route))
+                result = new_route.to_dict()
+                add_fare_version(new_route.id, result, new_route.created_at)
                 db.session.commit()
                 
-                return new_route.to_dict(), 201
+                return result, 201
                 
             except Exception as e:
                 print(f"Error in POST /api/routes: {str(e)}")
                 db.session.rollback()
                 return {"message": "Internal server error", "error": str(e)}, 500
 
+    @route_ns.route("/changes")
+    class RouteChangesResource(Resource):
+        def get(self):
+            """List routes created, updated or deleted since a sync version"""
+            try:
+                try:
+                    since = int(request.args.get('since', 0))
+                except ValueError:
+                    return {"message": "since must be an integer version"}, 400
+                if since > MAX_VERSION:
+                    return {"message": "since is not a valid sync version"}, 400
+
+                return route_changes(since), 200
+
+            except Exception as e:
+                print(f"Error in GET /api/routes/changes: {str(e)}")
+                return {"message": "Internal server error", "error": str(e)}, 500
+
     @route_ns.route("/<string:route_id>")
     class RouteResource(Resource):
         def get(self, route_id):
-            """Get a route by ID"""
+            """Get a route by ID, optionally with the fares in effect at ``as_of``"""
             try:
-                route = Route.query.get(route_id)
-                if not route:
+                as_of = None
+                if request.args.get('as_of'):
+                    try:
+                        as_of = parse_as_of(request.args['as_of'])
+                    except ValueError:
+                        return {"message": "as_of must be an ISO 8601 timestamp"}, 400
+
+                route_uuid = parse_uuid(route_id)
+                route = db.session.get(Route, route_uuid) if route_uuid else None
+                if not route or not route.is_active:
                     return {"message": "Route not found"}, 404
+                if as_of:
+                    return fare_timeline.get().apply(route.to_dict(), as_of), 200
                 return route.to_dict(), 200
             except Exception as e:
                 print(f"Error in GET /api/routes/{route_id}: {str(e)}")
@@ -519,28 +695,42 @@ def create_app():
         def put(self, route_id):
             """Update a route"""
             try:
-                route = Route.query.get(route_id)
-                if not route:
+                route_uuid = parse_uuid(route_id)
+                if not route_uuid:
                     return {"message": "Route not found"}, 404
                 
                 data = request.get_json()
                 
-                route.origin = data.get("origin", route.origin)
-                route.destination = data.get("destination", route.destination)
-                route.fare = data.get("fare", route.fare)
-                route.regular = data.get("regular", route.regular)
-                route.discount = data.get("discount", route.discount)
-                route.special = data.get("special", route.special)
+                changes = {
+                    key: data[key]
+                    for key in ("origin", "destination", "fare", "regular", "discount", "special", "description")
+                    if key in data
+                }
                 
                 if data.get("vehicle_type"):
                     if data["vehicle_type"] not in {v.value for v in VehicleTypeEnum}:
                         return {"message": "Invalid vehicle_type"}, 400
-                    route.vehicle_type = VehicleTypeEnum(data["vehicle_type"])
-                    
-                route.description = data.get("description", route.description)
+                    changes["vehicle_type"] = VehicleTypeEnum(data["vehicle_type"])
+                
+                if changes:
+                    route, before = update_returning(
+                        Route, [Route.id == route_uuid, Route.is_active.is_(True)], changes
+                    )
+                    if route:
+                        record(db.session, Route, "update", before=before, after=snapshot(route))
+                else:
+                    route = Route.query.filter_by(id=route_uuid, is_active=True).first()
+                
+                if not route:
+                    db.session.rollback()
+                    return {"message": "Route not found"}, 404
+                
+                result = route.to_dict()
+                if any(field in changes for field in FARE_FIELDS):
+                    add_fare_version(route.id, result, datetime.now(timezone.utc))
                 db.session.commit()
                 
-                return route.to_dict(), 200
+                return result, 200
                 
             except Exception as e:
                 print(f"Error in PUT /api/routes/{route_id}: {str(e)}")
@@ -548,13 +738,20 @@ def create_app():
                 return {"message": "Internal server error", "error": str(e)}, 500
 
         def delete(self, route_id):
-            """Delete a route"""
+            """Delete a route (kept as a tombstone for delta sync)"""
             try:
-                route = Route.query.get(route_id)
+                route_uuid = parse_uuid(route_id)
+                if not route_uuid:
+                    return {"message": "Route not found"}, 404
+                
+                route, before = update_returning(
+                    Route, [Route.id == route_uuid, Route.is_active.is_(True)], {"is_active": False}
+                )
                 if not route:
+                    db.session.rollback()
                     return {"message": "Route not found"}, 404
+                record(db.session, Route, "delete", before=before, after=snapshot(route))
                 
-                db.session.delete(route)
                 db.session.commit()
                 return {"message": "Route deleted successfully"}, 200
             except Exception as e:
@@ -562,8 +759,312 @@ def create_app():
                 db.session.rollback()
                 return {"message": "Internal server error", "error": str(e)}, 500
 
+    @route_ns.route("/<string:route_id>/fares")
+    class RouteFaresResource(Resource):
+        def get(self, route_id):
+            """Fare history of a route, including scheduled versions"""
+            try:
+                route_uuid = parse_uuid(route_id)
+                if not route_uuid:
+                    return {"message": "Route not found"}, 404
+                return fare_history(route_uuid), 200
+            except Exception as e:
+                print(f"Error in GET /api/routes/{route_id}/fares: {str(e)}")
+                return {"message": "Internal server error", "error": str(e)}, 500
+
+        @route_ns.expect(fare_version_model)
+        def post(self, route_id):
+            """Schedule a fare change that takes effect in the future"""
+            try:
+                route_uuid = parse_uuid(route_id)
+                if not route_uuid:
+                    return {"message": "Route not found"}, 404
+
+                data = request.get_json()
+
+                if not data.get("fare") or not data.get("effective_from"):
+                    return {"message": "fare and effective_from are required"}, 400
+
+                try:
+                    effective_from = parse_as_of(data["effective_from"])
+                except (TypeError, ValueError):
+                    return {"message": "effective_from must be an ISO 8601 timestamp"}, 400
+
+                if effective_from <= datetime.now(timezone.utc):
+                    return {"message": "effective_from must be in the future; use PUT for immediate changes"}, 400
+
+                route = Route.query.filter_by(id=route_uuid, is_active=True).first()
+                if not route:
+                    return {"message": "Route not found"}, 404
+
+                # Like PUT, fare classes left out keep the route's current value
+                fares = {field: data.get(field, getattr(route, field)) for field in FARE_FIELDS}
+                add_fare_version(route_uuid, fares, effective_from)
+                db.session.commit()
+
+                return {**fares, "route_id": str(route_uuid), "effective_from": effective_from.isoformat()}, 201
+
+            except Exception as e:
+                print(f"Error in POST /api/routes/{route_id}/fares: {str(e)}")
+                db.session.rollback()
+                return {"message": "Internal server error", "error": str(e)}, 500
+
     api.add_namespace(route_ns, path="/api/routes")
 
+    # ── FARE Namespace ─────────────────────
+    fare_ns = Namespace("fares", description="Fare quoting operations")
+
+    @fare_ns.route("/quote")
+    class FareQuoteResource(Resource):
+        @fare_ns.expect(fare_quote_model)
+        def post(self):
+            """Quote fares for many origin/destination pairs at once"""
+            try:
+                data = request.get_json(silent=True) or {}
+                quotes = data.get("quotes")
+
+                if not isinstance(quotes, list):
+                    return {"message": "quotes must be a list"}, 400
+
+                if len(quotes) > MAX_QUOTE_BATCH:
+                    return {"message": f"At most {MAX_QUOTE_BATCH} quotes per request"}, 400
+
+                try:
+                    origins      = [q["origin"] for q in quotes]
+                    destinations = [q["destination"] for q in quotes]
+                    vehicles     = [q["vehicle_type"] for q in quotes]
+                    classes      = [q.get("fare_class") or "regular" for q in quotes]
+                except (KeyError, TypeError):
+                    return {"message": "Each quote needs origin, destination, and vehicle_type"}, 400
+
+                fares = fare_matrix.get().quote(origins, destinations, vehicles, classes)
+                found = ~np.isnan(fares)
+
+                return {
+                    "fares": [float(f) if ok else None for f, ok in zip(fares.tolist(), found.tolist())],
+                    "matched": int(found.sum()),
+                    "total": len(quotes),
+                }, 200
+
+            except Exception as e:
+                print(f"Error in POST /api/fares/quote: {str(e)}")
+                return {"message": "Internal server error", "error": str(e)}, 500
+
+    api.add_namespace(fare_ns, path="/api/fares")
+
+    # ── PLACE Namespace ────────────────────
+    place_ns = Namespace("places", description="Place coordinates and nearest boarding points")
+
+    @place_ns.route("")
+    class PlacesResource(Resource):
+        def get(self):
+            """List all places with coordinates"""
+            try:
+                places = Place.query.order_by(Place.name).all()
+                return [place.to_dict() for place in places], 200
+            except Exception as e:
+                print(f"Error in GET /api/places: {str(e)}")
+                return {"message": "Internal server error", "error": str(e)}, 500
+
+        @place_ns.expect(place_model)
+        def post(self):
+            """Create or move a place (matched by name)"""
+            try:
+                data = request.get_json()
+
+                if not data.get("name") or data.get("lat") is None or data.get("lng") is None:
+                    return {"message": "name, lat, and lng are required"}, 400
+
+                if not isinstance(data["name"], str):
+                    return {"message": "name must be a string"}, 400
+
+                try:
+                    lat, lng = float(data["lat"]), float(data["lng"])
+                except (TypeError, ValueError):
+                    return {"message": "lat and lng must be numbers"}, 400
+                if not valid_coordinates(lat, lng):
+                    return {"message": "lat/lng out of range"}, 400
+
+                dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+                stmt = dialect.insert(Place).values(name=data["name"].strip(), lat=lat, lng=lng)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Place.name],
+                    set_={"lat": stmt.excluded.lat, "lng": stmt.excluded.lng, "updated_at": func.now()},
+                )
+                place = db.session.execute(stmt.returning(Place)).scalar_one()
+                result = place.to_dict()
+                db.session.commit()
+
+                return result, 200
+
+            except Exception as e:
+                print(f"Error in POST /api/places: {str(e)}")
+                db.session.rollback()
+                return {"message": "Internal server error", "error": str(e)}, 500
+
+    @place_ns.route("/nearest")
+    class NearestPlacesResource(Resource):
+        def get(self):
+            """Closest boarding points that have active routes"""
+            try:
+                try:
+                    lat = float(request.args["lat"])
+                    lng = float(request.args["lng"])
+                    limit = int(request.args.get('limit', 5))
+                except (KeyError, ValueError):
+                    return {"message": "lat and lng are required numbers, limit must be an integer"}, 400
+
+                if not valid_coordinates(lat, lng):
+                    return {"message": "lat/lng out of range"}, 400
+
+                if limit < 1 or limit > MAX_NEAREST_PLACES:
+                    limit = 5
+
+                vehicle_type_param = request.args.get('vehicle_type')
+                if vehicle_type_param and vehicle_type_param not in {v.value for v in VehicleTypeEnum}:
+                    return {"message": f"Invalid vehicle_type: {vehicle_type_param}"}, 400
+
+                return {"data": nearest_places(lat, lng, vehicle_type_param or None, limit)}, 200
+
+            except Exception as e:
+                print(f"Error in GET /api/places/nearest: {str(e)}")
+                return {"message": "Internal server error", "error": str(e)}, 500
+
+    api.add_namespace(place_ns, path="/api/places")
+
+    # ── AUDIT Namespace ────────────────────
+    audit_ns = Namespace("audit", description="Change history for routes and users")
+
+    @audit_ns.route("")
+    class AuditEventsResource(Resource):
+        @admin_required
+        def get(self, current_user):
+            """List audit events, newest first, filtered by table and row"""
+            try:
+                try:
+                    limit = int(request.args.get('limit', 50))
+                    if limit < 1 or limit > 500:
+                        limit = 50
+                except ValueError:
+                    return {"message": "limit must be an integer"}, 400
+
+                query = AuditEvent.query
+                if request.args.get('table'):
+                    query = query.filter_by(table_name=request.args['table'])
+                if request.args.get('row_id'):
+                    query = query.filter_by(row_id=request.args['row_id'])
+
+                events = query.order_by(AuditEvent.created_at.desc()).limit(limit).all()
+                return [event.to_dict() for event in events], 200
+
+            except Exception as e:
+                print(f"Error in GET /api/audit: {str(e)}")
+                return {"message": "Internal server error", "error": str(e)}, 500
+
+    @audit_ns.route("/metrics")
+    class AuditMetricsResource(Resource):
+        @admin_required
+        def get(self, current_user):
+            """Audit queue depth, backpressure, drop and write counters"""
+            return audit_log.metrics(), 200
+
+    api.add_namespace(audit_ns, path="/api/audit")
+
+    # ── SLOW QUERIES Namespace ─────────────
+    slow_query_ns = Namespace("slow-queries", description="Statements over the slow-query threshold (admin)")
+
+    @slow_query_ns.route("")
+    class SlowQueriesResource(Resource):
+        @admin_required
+        def get(self, current_user):
+            """Top slow statements by fingerprint, with plans"""
+            try:
+                limit = int(request.args.get('limit', 20))
+                if limit < 1 or limit > 100:
+                    limit = 20
+            except ValueError:
+                return {"message": "limit must be an integer"}, 400
+
+            sort = request.args.get('sort', 'total_ms')
+            if sort not in ("total_ms", "max_ms", "count"):
+                return {"message": "sort must be one of: total_ms, max_ms, count"}, 400
+
+            return slow_queries.report(limit, sort), 200
+
+        @admin_required
+        def delete(self, current_user):
+            """Clear the collected statistics"""
+            slow_queries.reset()
+            return {"message": "Slow query statistics cleared"}, 200
+
+    api.add_namespace(slow_query_ns, path="/api/slow-queries")
+
+    # ── PROFILING Namespace ────────────────
+    profile_ns = Namespace("profiling", description="On-demand request profiling (admin)")
+
+    @profile_ns.route("")
+    class ProfilesResource(Resource):
+        @admin_required
+        def get(self, current_user):
+            """List captured profiles, newest first"""
+            return profiler.list(), 200
+
+    @profile_ns.route("/window")
+    class ProfileWindowResource(Resource):
+        @admin_required
+        def post(self, current_user):
+            """Sample every thread of this worker for a number of seconds"""
+            data = request.get_json(silent=True) or {}
+            try:
+                seconds = float(data.get("seconds", 10))
+                interval_ms = float(data.get("interval_ms", 1))
+            except (TypeError, ValueError):
+                return {"message": "seconds and interval_ms must be numbers"}, 400
+
+            if not (0 < seconds <= 60) or not (0.1 <= interval_ms <= 1000):
+                return {"message": "seconds must be in (0, 60] and interval_ms in [0.1, 1000]"}, 400
+
+            profile_id = profiler.start_window(seconds, interval_ms / 1000)
+            return {"id": profile_id, "ready_in_seconds": seconds}, 202
+
+    @profile_ns.route("/<string:profile_id>")
+    class ProfileResource(Resource):
+        @admin_required
+        def get(self, current_user, profile_id):
+            """Download a profile as collapsed stacks (default) or speedscope JSON"""
+            profile = profiler.get(profile_id)
+            if not profile:
+                return {"message": "Profile not found"}, 404
+
+            if request.args.get('format') == "speedscope":
+                return to_speedscope(profile), 200, {
+                    "Content-Disposition": f"attachment; filename=profile-{profile_id}.speedscope.json"
+                }
+
+            return app.response_class(
+                to_collapsed(profile),
+                mimetype="text/plain",
+                headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.collapsed.txt"},
+            )
+
+    api.add_namespace(profile_ns, path="/api/profiling")
+
+    # ── CLI ────────────────────────────────
+    @app.cli.command("compact-tombstones")
+    def compact_tombstones_command():
+        """Hard-delete route tombstones older than TOMBSTONE_RETENTION_DAYS"""
+        removed = compact_tombstones()
+        print(f"Removed {removed} route tombstone(s).")
+
+    @app.cli.command("apply-due-fares")
+    def apply_due_fares_command():
+        """Copy scheduled fare versions that are now in effect onto their routes"""
+        updated = apply_due_fares()
+        if updated is None:
+            print("Another process is applying due fares; nothing done.")
+        else:
+            print(f"Updated fares on {updated} route(s).")
+
     return app
 
 # ── Run App ─────────────────────────────
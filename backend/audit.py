@@ -0,0 +1,219 @@
+"""
+Write-behind audit log for Route and User changes.
+
+Write paths call ``record()`` with before/after snapshots. Events are held on
+the session until it commits, then pushed onto a bounded in-process queue; a
+background thread drains the queue into ``audit_events`` in batches, so the
+request never waits on the audit insert. When the queue is full new events
+are dropped and counted rather than blocking the writer. The queue is
+drained on interpreter shutdown.
+"""
+
+import atexit
+import enum
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import jwt
+from flask import has_request_context, request
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import db, AuditEvent
+
+_PENDING = "audit_pending"
+
+# Never copied into audit snapshots
+REDACTED_COLUMNS = {"hashed_password"}
+
+
+# ── Snapshots ────────────────────────────
+def _jsonable(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def snapshot(obj) -> dict:
+    """Column values of a model instance (or row mapping), minus secrets"""
+    if hasattr(obj, "__table__"):
+        values = {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+    else:
+        values = dict(obj)
+    return {k: _jsonable(v) for k, v in values.items() if k not in REDACTED_COLUMNS}
+
+
+def update_returning(model, criteria, values):
+    """Run ``UPDATE model ... RETURNING`` and also hand back the pre-update row.
+
+    On Postgres this stays one statement: a locking CTE reads the old row and
+    the UPDATE returns both versions. SQLite can't return pre-update values,
+    so it reads the row first.
+    Returns ``(obj, before_snapshot)`` or ``(None, None)`` when nothing matched.
+    """
+    table = model.__table__
+    stmt = update(model).values(**values).execution_options(populate_existing=True)
+
+    if db.engine.dialect.name == "postgresql":
+        old = select(table).where(*criteria).with_for_update().cte("old")
+        stmt = stmt.where(table.c.id == old.c.id).returning(model, *old.c)
+        row = db.session.execute(stmt).one_or_none()
+        if row is None:
+            return None, None
+        return row[0], snapshot(dict(zip(old.c.keys(), row[1:])))
+
+    before = db.session.execute(select(table).where(*criteria)).mappings().one_or_none()
+    if before is None:
+        return None, None
+    obj = db.session.execute(stmt.where(*criteria).returning(model)).scalar_one()
+    return obj, snapshot(before)
+
+
+def current_actor():
+    """User id from the request's bearer token, if any (signature checked, no DB hit)"""
+    if not has_request_context():
+        return None
+    token = request.headers.get("Authorization", "")
+    if token.startswith("Bearer "):
+        token = token.split(" ", 1)[1]
+    if not token:
+        return None
+    try:
+        data = jwt.decode(token, os.getenv("SECRET_KEY", "fallback-secret"), algorithms=["HS256"])
+        return data.get("user_id")
+    except jwt.InvalidTokenError:
+        return None
+
+
+def record(session, model, action: str, before=None, after=None):
+    """Queue an audit event to be written once ``session`` commits"""
+    row = after or before or {}
+    session.info.setdefault(_PENDING, []).append({
+        "id": uuid.uuid4(),
+        "table_name": model.__tablename__,
+        "row_id": row.get("id"),
+        "action": action,
+        "actor_id": current_actor(),
+        "before": before,
+        "after": after,
+        "created_at": datetime.now(timezone.utc),
+    })
+
+
+# ── Write-behind queue ───────────────────
+class AuditLog:
+    batch_size = 500
+    flush_interval = 0.5
+    max_attempts = 3
+
+    def __init__(self):
+        self.app = None
+        self.capacity = 0
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.high_watermark = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.capacity = int(os.getenv("AUDIT_QUEUE_SIZE", 10000))
+        self._queue = queue.Queue(maxsize=self.capacity)
+        atexit.register(self.close)
+
+    def submit(self, events):
+        if self.app is None:
+            return
+        self._start()
+        for item in events:
+            try:
+                self._queue.put_nowait(item)
+                self.enqueued += 1
+            except queue.Full:
+                self.dropped += 1
+        self.high_watermark = max(self.high_watermark, self._queue.qsize())
+
+    def _start(self):
+        """Start the writer once per process (safe to call after fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name="audit-writer", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far, batch by batch"""
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                self._write(batch)
+
+    def _write(self, batch):
+        for attempt in range(self.max_attempts):
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conn:
+                        conn.execute(insert(AuditEvent.__table__), batch)
+                self.written += len(batch)
+                return
+            except Exception as e:
+                print(f"Audit flush failed (attempt {attempt + 1}): {str(e)}")
+                time.sleep(0.1 * (attempt + 1))
+        self.failed += len(batch)
+
+    def close(self):
+        if self._queue is not None:
+            self.flush()
+
+    def metrics(self) -> dict:
+        depth = self._queue.qsize() if self._queue is not None else 0
+        return {
+            "queue_depth": depth,
+            "queue_capacity": self.capacity,
+            "backpressure": bool(self.capacity) and depth >= 0.8 * self.capacity,
+            "high_watermark": self.high_watermark,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+
+audit_log = AuditLog()
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_on_commit(session):
+    events = session.info.pop(_PENDING, None)
+    if events:
+        audit_log.submit(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,338 @@
+"""
+Cross-worker cache invalidation bus.
+
+Any commit that touches a table publishes a ``{"table": ..., "sender": ...}``
+event. The committing worker runs its own subscribers right after the commit;
+every other worker receives the event through the configured transport:
+
+* ``postgres`` — LISTEN/NOTIFY. Notifications are sent after the commit
+  from a background publisher, so they never add a round trip to writes;
+  a failed send is retried on a new connection, and anything still queued
+  is sent before the process exits.
+* ``file:<path>`` — an append-only event log tailed by every worker, a
+  stand-in for SQLite and tests.
+* unset — in-process only (a single worker needs nothing else).
+
+The transport comes from ``CACHE_BUS`` and is off unless set; ``auto`` picks
+LISTEN/NOTIFY on Postgres. The gunicorn config defaults it to ``auto``, while
+short-lived serverless instances (Vercel) don't hold the two extra
+connections and background threads the Postgres transport needs.
+
+As a backstop for events that never arrive, cached snapshots are also
+rebuilt once they are ``CACHE_MAX_AGE_SECONDS`` old (0 disables).
+"""
+
+import atexit
+import json
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from replica import primary_reads
+
+CHANNEL = "lagona_cache"
+ALL_TABLES = "*"
+
+_CHANGED_TABLES = "changed_tables"
+
+
+class CacheBus:
+    def __init__(self):
+        self.sender = uuid.uuid4().hex
+        self.transport = None
+        self._subscribers = defaultdict(list)
+        self._pid = None
+        self._lock = threading.Lock()
+        # Set once this process is receiving changes
+        self.listening = threading.Event()
+
+    # ── Subscribers ─────────────────────────
+    def subscribe(self, table: str, callback):
+        """Call ``callback(table)`` whenever ``table`` changes (``"*"`` for any)"""
+        self._subscribers[table].append(callback)
+
+    def dispatch(self, table: str):
+        if table == ALL_TABLES:
+            callbacks = [cb for cbs in self._subscribers.values() for cb in cbs]
+        else:
+            callbacks = self._subscribers[table] + self._subscribers[ALL_TABLES]
+        for callback in callbacks:
+            try:
+                callback(table)
+            except Exception as e:
+                print(f"Error in cache bus subscriber for {table}: {str(e)}")
+
+    def _receive(self, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("sender") != self.sender:
+            self.dispatch(message.get("table", ALL_TABLES))
+
+    # ── Transport ───────────────────────────
+    def init_app(self, app, db):
+        """Pick a transport and start listening lazily in each worker process"""
+        setting = os.getenv("CACHE_BUS", "")
+        if setting == "auto":
+            setting = "postgres" if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql") else ""
+
+        if setting == "postgres":
+            self.transport = PostgresTransport(self, app, db)
+        elif setting.startswith("file:"):
+            self.transport = FileTransport(self, setting[len("file:"):])
+
+        @app.before_request
+        def _start_cache_bus():
+            self.start()
+
+    def start(self):
+        """Start the listener once per process (safe to call after fork)"""
+        if self.transport is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self.sender = uuid.uuid4().hex
+                self.listening = threading.Event()
+                self.transport.start()
+                self._pid = os.getpid()
+
+
+class PostgresTransport:
+    poll_timeout = 5.0
+    retry_delay = 1.0
+    drain_timeout = 5.0
+    publish_attempts = 3
+
+    def __init__(self, bus, app, db):
+        self.bus = bus
+        self.app = app
+        self.db = db
+        self._outbox = queue.Queue()
+        self._publisher_pid = None
+        self._publisher = None
+        atexit.register(self._drain)
+
+    def start(self):
+        threading.Thread(target=self._listen, name="cache-bus", daemon=True).start()
+
+    def publish(self, tables):
+        for table in sorted(tables):
+            self._outbox.put(json.dumps({"table": table, "sender": self.bus.sender}))
+        if self._publisher_pid != os.getpid():
+            self._publisher_pid = os.getpid()
+            self._publisher = threading.Thread(target=self._publish_loop, name="cache-bus-publish", daemon=True)
+            self._publisher.start()
+
+    def _connect(self):
+        with self.app.app_context():
+            conn = self.db.engine.raw_connection()
+        dbapi_conn = conn.dbapi_connection
+        conn.detach()
+        dbapi_conn.autocommit = True
+        return dbapi_conn
+
+    def _publish_loop(self):
+        dbapi_conn = None
+        while True:
+            payload = self._outbox.get()
+            if payload is None:
+                return
+            # The idle connection may have been closed by the server or the
+            # pooler; send again on a fresh one rather than lose the event
+            for attempt in range(self.publish_attempts):
+                try:
+                    if dbapi_conn is None:
+                        dbapi_conn = self._connect()
+                    dbapi_conn.cursor().execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+                    break
+                except Exception as e:
+                    print(f"Cache bus publish error (attempt {attempt + 1}/{self.publish_attempts}): {str(e)}")
+                    dbapi_conn = None
+                    if attempt:
+                        time.sleep(self.retry_delay)
+
+    def _drain(self):
+        """At exit, wait (bounded) for queued notifications to go out"""
+        if self._publisher is None or self._publisher_pid != os.getpid():
+            return
+        self._outbox.put(None)
+        self._publisher.join(self.drain_timeout)
+
+    def _listen(self):
+        while True:
+            dbapi_conn = None
+            try:
+                dbapi_conn = self._connect()
+                dbapi_conn.cursor().execute(f"LISTEN {CHANNEL}")
+                # Anything could have changed while we weren't listening
+                self.bus.dispatch(ALL_TABLES)
+                self.bus.listening.set()
+
+                while True:
+                    if select.select([dbapi_conn], [], [], self.poll_timeout) == ([], [], []):
+                        # Quiet channel: make sure the socket isn't half-open
+                        dbapi_conn.cursor().execute("SELECT 1")
+                        continue
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        self.bus._receive(dbapi_conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Cache bus listener error: {str(e)}")
+                if dbapi_conn is not None:
+                    try:
+                        dbapi_conn.close()
+                    except Exception:
+                        pass
+                time.sleep(self.retry_delay)
+
+
+class FileTransport:
+    poll_interval = 0.02
+
+    def __init__(self, bus, path):
+        self.bus = bus
+        self.path = path
+
+    def start(self):
+        with open(self.path, "a"):
+            pass
+        offset = os.path.getsize(self.path)
+        threading.Thread(target=self._tail, args=(offset,), name="cache-bus", daemon=True).start()
+        self.bus.listening.set()
+
+    def publish(self, tables):
+        lines = "".join(json.dumps({"table": t, "sender": self.bus.sender}) + "\n" for t in sorted(tables))
+        with open(self.path, "a") as f:
+            f.write(lines)
+
+    def _tail(self, offset):
+        buffer = ""
+        while True:
+            try:
+                with open(self.path) as f:
+                    f.seek(offset)
+                    chunk = f.read()
+                    offset = f.tell()
+            except OSError:
+                chunk = ""
+            buffer += chunk
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                self.bus._receive(line)
+            time.sleep(self.poll_interval)
+
+
+cache_bus = CacheBus()
+
+
+class CachedSnapshot:
+    """Value built on first use, dropped whenever one of ``tables`` changes
+    and rebuilt once it is ``max_age`` seconds old"""
+
+    def __init__(self, build, *tables):
+        self._build = build
+        self._value = None
+        self._generation = 0
+        self._built_at = 0.0
+        self.max_age = float(os.getenv("CACHE_MAX_AGE_SECONDS", 300))
+        # Reentrant: a build that triggers an invalidation must not deadlock
+        self._lock = threading.RLock()
+        for table in tables:
+            cache_bus.subscribe(table, lambda table: self.invalidate())
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self):
+        # Serialized with get()/prime() so a value built before this call is
+        # never stored after it
+        with self._lock:
+            self._generation += 1
+            self._value = None
+
+    def peek(self):
+        """The current value, or None, without building it"""
+        return self._value
+
+    def prime(self, value, generation: int):
+        """Install a value built elsewhere unless invalidated since ``generation``"""
+        with self._lock:
+            if generation == self._generation:
+                self._value = value
+                self._built_at = time.monotonic()
+
+    def _fresh(self, value) -> bool:
+        return value is not None and (
+            self.max_age <= 0 or time.monotonic() - self._built_at < self.max_age
+        )
+
+    def get(self):
+        value = self._value
+        if self._fresh(value):
+            return value
+
+        with self._lock:
+            if not self._fresh(self._value):
+                generation = self._generation
+                # Built from the primary: the invalidation that got us here
+                # usually arrives before a replica has the change
+                with primary_reads():
+                    value = self._build()
+                # A commit landed mid-build: serve this snapshot but don't keep it
+                if generation == self._generation:
+                    self._value = value
+                    self._built_at = time.monotonic()
+                return value
+            return self._value
+
+
+# ── Session hooks ────────────────────────
+def mark_changed(session, *tables):
+    """Record tables changed by statements the hooks below can't see (raw SQL)"""
+    session.info.setdefault(_CHANGED_TABLES, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_changes(session, flush_context):
+    tables = {
+        obj.__tablename__
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__tablename__")
+    }
+    if tables:
+        mark_changed(session, *tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_dml(orm_execute_state):
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete:
+        mark_changed(state.session, state.statement.table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    tables = session.info.pop(_CHANGED_TABLES, None)
+    if not tables:
+        return
+    for table in tables:
+        cache_bus.dispatch(table)
+    if cache_bus.transport is not None:
+        try:
+            cache_bus.transport.publish(tables)
+        except Exception as e:
+            print(f"Error publishing cache invalidation: {str(e)}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop(_CHANGED_TABLES, None)
@@ -0,0 +1,105 @@
+"""
+Dense fare matrix used for batch fare quoting.
+
+Active routes are folded into one NumPy array indexed by
+[vehicle_type, origin, destination, fare_class]. Place names are interned to
+integer ids (their position in a sorted name array), so a batch of quotes is
+resolved with a few searchsorted calls and a single array gather.
+"""
+
+import numpy as np
+
+from cache_bus import CachedSnapshot
+from models import db, Route, VehicleTypeEnum
+
+# Both kept sorted: their positions double as the interned ids
+FARE_CLASSES = ("discount", "regular", "special")
+VEHICLE_TYPES = tuple(sorted(v.value for v in VehicleTypeEnum))
+
+
+def normalize_place(name) -> str:
+    """Places match case-insensitively, same as the landing page search"""
+    return str(name or "").strip().lower()
+
+
+def _intern(sorted_names: np.ndarray, values) -> np.ndarray:
+    """Map each value to its index in ``sorted_names``, or -1 if unknown"""
+    values = np.asarray(values, dtype=str)
+    if not len(sorted_names) or not len(values):
+        return np.full(len(values), -1, dtype=np.intp)
+    idx = np.searchsorted(sorted_names, values)
+    idx = np.minimum(idx, len(sorted_names) - 1)
+    return np.where(sorted_names[idx] == values, idx, -1)
+
+
+class FareMatrix:
+    """Immutable snapshot of active route fares"""
+
+    def __init__(self, places: np.ndarray, fares: np.ndarray, route_count: int):
+        self.places = places
+        self.fares = fares
+        self.route_count = route_count
+
+    @classmethod
+    def from_rows(cls, rows) -> "FareMatrix":
+        """Build from (origin, destination, vehicle_type, fare, *FARE_CLASSES) rows.
+
+        Rows are applied in order, so when several active routes share the
+        same origin/destination/vehicle_type the last one wins. A class fare
+        of 0 means "not set" (as in the admin UI) and is stored as NaN, except
+        that an unset regular fare falls back to the route's base ``fare``.
+        """
+        rows = list(rows)
+        origins = [normalize_place(r[0]) for r in rows]
+        destinations = [normalize_place(r[1]) for r in rows]
+        places = np.array(sorted(set(origins) | set(destinations)), dtype=str)
+
+        n = len(places)
+        fares = np.full((len(VEHICLE_TYPES), n, n, len(FARE_CLASSES)), np.nan, dtype=np.float32)
+
+        if rows:
+            vehicles = [r[2].value if isinstance(r[2], VehicleTypeEnum) else r[2] for r in rows]
+            v = _intern(np.array(VEHICLE_TYPES), vehicles)
+            o = _intern(places, origins)
+            d = _intern(places, destinations)
+            base = np.array([r[3] for r in rows], dtype=np.float32)
+            values = np.array([r[4:7] for r in rows], dtype=np.float32)
+            regular = FARE_CLASSES.index("regular")
+            values[:, regular] = np.where(values[:, regular] > 0, values[:, regular], base)
+            values[values <= 0] = np.nan
+            fares[v, o, d] = values
+
+        return cls(places, fares, len(rows))
+
+    def quote(self, origins, destinations, vehicle_types, fare_classes) -> np.ndarray:
+        """Look up fares for parallel sequences of quote fields.
+
+        Returns a float array aligned with the inputs; pairs with no active
+        route (or unknown names) come back as NaN.
+        """
+        o = _intern(self.places, [normalize_place(x) for x in origins])
+        d = _intern(self.places, [normalize_place(x) for x in destinations])
+        v = _intern(np.array(VEHICLE_TYPES), vehicle_types)
+        c = _intern(np.array(FARE_CLASSES), fare_classes)
+
+        known = (o >= 0) & (d >= 0) & (v >= 0) & (c >= 0)
+        result = np.full(len(o), np.nan, dtype=np.float32)
+        if self.fares.size:
+            result[known] = self.fares[v[known], o[known], d[known], c[known]]
+        return result
+
+
+def _load_fare_matrix() -> FareMatrix:
+    rows = (
+        db.session.query(
+            Route.origin, Route.destination, Route.vehicle_type, Route.fare,
+            *(getattr(Route, c) for c in FARE_CLASSES),
+        )
+        .filter(Route.is_active.is_(True))
+        .order_by(Route.updated_at)
+        .all()
+    )
+    return FareMatrix.from_rows(rows)
+
+
+fare_matrix = CachedSnapshot(_load_fare_matrix, Route.__tablename__)
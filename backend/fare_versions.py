@@ -0,0 +1,190 @@
+"""
+Time-versioned fares.
+
+Each fare change adds a ``fare_versions`` row that is in effect from its
+``effective_from`` until the route's next version starts, so old tariffs are
+kept and upcoming ones can be loaded ahead of time. The ``routes`` fare
+columns remain the current fare, so plain reads are unchanged;
+``apply_due_fares()`` copies scheduled versions onto routes once they take
+effect. Route and fare reads call ``apply_fares_if_due()`` first, which runs
+it as soon as the timeline shows a version has come due, so a new tariff is
+served from its ``effective_from`` without a scheduled job.
+
+``as_of`` lookups are answered from an in-memory timeline: per route, the
+version start times are kept sorted and searched with bisect.
+"""
+
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import func, insert, or_, select, text
+
+from audit import record, snapshot, update_returning
+from cache_bus import CachedSnapshot
+from models import db, FareVersion, Route
+from replica import primary_reads
+
+FARE_FIELDS = ("fare", "regular", "discount", "special")
+
+# pg_try_advisory_xact_lock key, so only one worker applies a due version
+APPLY_LOCK_KEY = 3_402_117
+
+
+def parse_as_of(value: str) -> datetime:
+    """ISO 8601 timestamp; naive values are taken as UTC"""
+    if not isinstance(value, str):
+        raise ValueError("timestamp must be a string")
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _aware(ts: datetime) -> datetime:
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+class FareTimeline:
+    """Immutable per-route fare history"""
+
+    def __init__(self, versions):
+        starts = defaultdict(list)
+        fares = defaultdict(list)
+        for v in versions:
+            key = str(v.route_id)
+            starts[key].append(_aware(v.effective_from))
+            fares[key].append({field: float(getattr(v, field)) for field in FARE_FIELDS})
+        self.starts = {key: tuple(values) for key, values in starts.items()}
+        self.fares = {key: tuple(values) for key, values in fares.items()}
+        self.all_starts = tuple(sorted(ts for values in self.starts.values() for ts in values))
+
+    def fares_at(self, route_id: str, ts: datetime):
+        """Fare fields in effect for a route at ``ts``, or None before its first version"""
+        starts = self.starts.get(route_id)
+        if not starts:
+            return None
+        i = bisect_right(starts, ts) - 1
+        return self.fares[route_id][i] if i >= 0 else None
+
+    def next_start_after(self, ts: datetime):
+        """Earliest version start of any route after ``ts``, or None"""
+        i = bisect_right(self.all_starts, ts)
+        return self.all_starts[i] if i < len(self.all_starts) else None
+
+    def apply(self, route: dict, ts: datetime) -> dict:
+        """Route dict with its fare fields as of ``ts``"""
+        fares = self.fares_at(route["id"], ts)
+        return {**route, **fares} if fares else route
+
+
+def _load_timeline() -> FareTimeline:
+    versions = (
+        db.session.query(FareVersion.route_id, FareVersion.effective_from, *(getattr(FareVersion, f) for f in FARE_FIELDS))
+        .order_by(FareVersion.route_id, FareVersion.effective_from)
+        .all()
+    )
+    return FareTimeline(versions)
+
+
+fare_timeline = CachedSnapshot(_load_timeline, FareVersion.__tablename__)
+
+
+def add_fare_version(route_id, fares: dict, effective_from: datetime):
+    """Queue the INSERT for a new version on the current session"""
+    db.session.execute(
+        insert(FareVersion).values(
+            route_id=route_id,
+            effective_from=effective_from,
+            **{field: fares[field] for field in FARE_FIELDS},
+        )
+    )
+
+
+def fare_history(route_id):
+    """Versions of one route, oldest first, with the implied ``effective_to``"""
+    versions = (
+        FareVersion.query
+        .filter_by(route_id=route_id)
+        .order_by(FareVersion.effective_from)
+        .all()
+    )
+    history = [v.to_dict() for v in versions]
+    for current, following in zip(history, history[1:] + [None]):
+        current["effective_to"] = following["effective_from"] if following else None
+    return history
+
+
+def apply_due_fares(now: datetime = None, since: datetime = None):
+    """Copy versions that are now in effect onto their routes' fare columns.
+
+    The due version of each route (its latest with ``effective_from <= now``)
+    is read inside the locked transaction, never from the cached timeline, so
+    a newer edit can't be overwritten by a stale copy. With ``since``, only
+    routes that have a version starting after it are looked at.
+    Returns the number of routes updated, or None when another worker holds
+    the apply lock (Postgres only).
+    """
+    now = now or datetime.now(timezone.utc)
+    if db.engine.dialect.name == "postgresql":
+        locked = db.session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": APPLY_LOCK_KEY}).scalar()
+        if not locked:
+            db.session.rollback()
+            return None
+
+    latest = select(FareVersion.route_id, func.max(FareVersion.effective_from).label("effective_from"))
+    latest = latest.where(FareVersion.effective_from <= now).group_by(FareVersion.route_id)
+    if since is not None:
+        started = select(FareVersion.route_id).where(FareVersion.effective_from > since, FareVersion.effective_from <= now)
+        latest = latest.where(FareVersion.route_id.in_(started))
+    latest = latest.subquery()
+
+    due_rows = db.session.execute(
+        select(FareVersion.route_id, *(getattr(FareVersion, f) for f in FARE_FIELDS))
+        .join(latest, (FareVersion.route_id == latest.c.route_id) & (FareVersion.effective_from == latest.c.effective_from))
+        .join(Route, Route.id == FareVersion.route_id)
+        .where(Route.is_active.is_(True), or_(*(getattr(Route, f) != getattr(FareVersion, f) for f in FARE_FIELDS)))
+        .order_by(FareVersion.created_at)
+    ).all()
+    # Versions sharing a start time: the one created last wins
+    due = {row.route_id: {f: getattr(row, f) for f in FARE_FIELDS} for row in due_rows}
+
+    updated = 0
+    for route_id, fares in due.items():
+        route, before = update_returning(Route, [Route.id == route_id], fares)
+        if route:
+            record(db.session, Route, "update", before=before, after=snapshot(route))
+            updated += 1
+    if updated:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return updated
+
+
+_applied_through = None
+_apply_lock = threading.Lock()
+
+
+def apply_fares_if_due() -> int:
+    """Run ``apply_due_fares()`` when a version has started since this process last did"""
+    global _applied_through
+    now = datetime.now(timezone.utc)
+    if _applied_through is not None:
+        upcoming = fare_timeline.get().next_start_after(_applied_through)
+        if upcoming is None or upcoming > now:
+            return 0
+
+    if not _apply_lock.acquire(blocking=False):
+        return 0
+    try:
+        with primary_reads():
+            updated = apply_due_fares(now, since=_applied_through)
+        if updated is not None:
+            _applied_through = now
+        return updated or 0
+    except Exception as e:
+        print(f"Applying due fares failed: {str(e)}")
+        db.session.rollback()
+        return 0
+    finally:
+        _apply_lock.release()
@@ -0,0 +1,36 @@
+"""
+Production server settings.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (``preload_app``); the route catalog
+is preloaded there before workers fork, and each worker warms its connection
+pool afterwards. Point the load balancer's readiness probe at ``GET /ready``.
+"""
+
+import multiprocessing
+import os
+
+# Long-lived workers share cache invalidations over LISTEN/NOTIFY; set before
+# the app is imported below
+os.environ.setdefault("CACHE_BUS", "auto")
+
+from warmup import warmup
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+
+def when_ready(server):
+    warmup.preload()
+
+
+def post_fork(server, worker):
+    warmup.start(connections=threads)
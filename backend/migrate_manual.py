@@ -1,12 +1,18 @@
 """
 Manual migration script — runs CREATE TABLE directly against Supabase.
 Use this if you prefer not to use the Flask-Migrate CLI.
+
+Safe to run against a live database: each step commits on its own under a
+lock timeout (retried with backoff), indexes are built CONCURRENTLY and
+backfills run in throttled batches. See online_migrations.py.
 """
 
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
+from online_migrations import autocommit, backfill, create_index, locked_ddl
+
 load_dotenv()
 
 # Fix: '@' in password must be percent-encoded or psycopg2 misreads the host
@@ -32,9 +38,6 @@ CREATE TABLE IF NOT EXISTS users (
     created_at  TIMESTAMP NOT NULL DEFAULT now(),
     updated_at  TIMESTAMP NOT NULL DEFAULT now()
 );
-
-CREATE INDEX IF NOT EXISTS ix_users_username ON users (username);
-CREATE INDEX IF NOT EXISTS ix_users_email    ON users (email);
 """
 
 CREATE_ROUTES = """
@@ -54,6 +57,61 @@ CREATE TABLE IF NOT EXISTS routes (
 );
 """
 
+CREATE_PLACES = """
+CREATE TABLE IF NOT EXISTS places (
+    id          UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    name        VARCHAR(100) NOT NULL UNIQUE,
+    lat         FLOAT        NOT NULL,
+    lng         FLOAT        NOT NULL,
+    created_at  TIMESTAMP NOT NULL DEFAULT now(),
+    updated_at  TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+
+CREATE_AUDIT_EVENTS = """
+CREATE TABLE IF NOT EXISTS audit_events (
+    id          UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    table_name  VARCHAR(50) NOT NULL,
+    row_id      VARCHAR(36),
+    action      VARCHAR(10) NOT NULL,
+    actor_id    VARCHAR(36),
+    before      JSON,
+    after       JSON,
+    created_at  TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+
+CREATE_FARE_VERSIONS = """
+CREATE TABLE IF NOT EXISTS fare_versions (
+    id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    route_id        UUID NOT NULL REFERENCES routes (id) ON DELETE CASCADE,
+    fare            FLOAT NOT NULL,
+    regular         FLOAT NOT NULL DEFAULT 0.0,
+    discount        FLOAT NOT NULL DEFAULT 0.0,
+    special         FLOAT NOT NULL DEFAULT 0.0,
+    effective_from  TIMESTAMP NOT NULL,
+    created_at      TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+
+# Built CONCURRENTLY, after the tables exist
+INDEXES = [
+    ("ix_users_username", "users", ["username"]),
+    ("ix_users_email", "users", ["email"]),
+    ("ix_routes_updated_at", "routes", ["updated_at"]),
+    ("ix_audit_events_row", "audit_events", ["table_name", "row_id", "created_at"]),
+    ("ix_fare_versions_route_effective", "fare_versions", ["route_id", "effective_from"]),
+]
+
+# Existing routes start with their current fares as the first version
+BACKFILL_FARE_VERSIONS = """
+INSERT INTO fare_versions (route_id, fare, regular, discount, special, effective_from)
+SELECT r.id, r.fare, r.regular, r.discount, r.special, r.created_at
+FROM routes r
+WHERE (:after IS NULL OR r.id > :after) AND r.id <= :upper
+  AND NOT EXISTS (SELECT 1 FROM fare_versions v WHERE v.route_id = r.id)
+"""
+
 CREATE_TRIGGER_FN = """
 CREATE OR REPLACE FUNCTION set_updated_at()
 RETURNS TRIGGER AS $$
@@ -64,16 +122,11 @@ END;
 $$ LANGUAGE plpgsql;
 """
 
-CREATE_TRIGGERS = """
+# One statement per table, so waiting on one table's lock holds no other
+CREATE_TRIGGER = """
 DO $$ BEGIN
-    CREATE TRIGGER trg_users_updated_at
-        BEFORE UPDATE ON users
-        FOR EACH ROW EXECUTE FUNCTION set_updated_at();
-EXCEPTION WHEN duplicate_object THEN null; END $$;
-
-DO $$ BEGIN
-    CREATE TRIGGER trg_routes_updated_at
-        BEFORE UPDATE ON routes
+    CREATE TRIGGER trg_{table}_updated_at
+        BEFORE UPDATE ON {table}
         FOR EACH ROW EXECUTE FUNCTION set_updated_at();
 EXCEPTION WHEN duplicate_object THEN null; END $$;
 """
@@ -85,15 +138,28 @@ def run_migration():
         ("Creating ENUM type", CREATE_ENUM),
         ("Creating users table", CREATE_USERS),
         ("Creating routes table", CREATE_ROUTES),
+        ("Creating places table", CREATE_PLACES),
+        ("Creating audit_events table", CREATE_AUDIT_EVENTS),
+        ("Creating fare_versions table", CREATE_FARE_VERSIONS),
         ("Creating updated_at trigger function", CREATE_TRIGGER_FN),
-        ("Attaching triggers", CREATE_TRIGGERS),
+        *(
+            (f"Attaching {table} trigger", CREATE_TRIGGER.format(table=table))
+            for table in ("users", "routes", "places")
+        ),
     ]
 
     with engine.connect() as conn:
+        conn = autocommit(conn)
         for label, sql in steps:
             print(f"  -> {label}...")
-            conn.execute(text(sql))
-        conn.commit()
+            locked_ddl(conn, sql, label)
+
+        for name, table, columns in INDEXES:
+            print(f"  -> Building index {name} (concurrently)...")
+            create_index(conn, name, table, columns)
+
+        print("  -> Backfilling fare_versions...")
+        backfill(conn, "routes", BACKFILL_FARE_VERSIONS, "fare_versions")
 
     print("\nMigration complete - tables created on Supabase.")
 
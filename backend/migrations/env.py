@@ -1,10 +1,13 @@
 import logging
+import time
 from logging.config import fileConfig
 
 from flask import current_app
 
 from alembic import context
 
+from online_migrations import set_lock_timeout, with_lock_retry
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -90,21 +93,40 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # report how long each revision took
+    last_applied = [time.monotonic()]
+
+    def on_version_apply(ctx, step, heads, run_args):
+        now = time.monotonic()
+        logger.info('Applied %s in %.1fs', step.up_revision_id, now - last_applied[0])
+        last_applied[0] = now
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    # commit revision by revision so locks are released between them and a
+    # lock timeout only retries the revision that hit it
+    conf_args.setdefault("transaction_per_migration", True)
+    conf_args.setdefault("on_version_apply", on_version_apply)
 
     connectable = get_engine()
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=get_metadata(),
-            **conf_args
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+    def run():
+        with connectable.connect() as connection:
+            # DDL waiting on a busy table gives up (and is retried) instead
+            # of queueing live queries behind it
+            set_lock_timeout(connection)
+            connection.commit()
+            context.configure(
+                connection=connection,
+                target_metadata=get_metadata(),
+                **conf_args
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+
+    with_lock_retry('migration', run)
 
 
 if context.is_offline_mode():
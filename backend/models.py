@@ -4,8 +4,9 @@ from sqlalchemy import func
 import uuid
 from datetime import datetime, timezone
 import enum
+from replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class VehicleTypeEnum(enum.Enum):
     jeep = "jeep"
@@ -38,7 +39,7 @@ class Route(db.Model):
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False, index=True)
     
     def to_dict(self):
         return {
@@ -52,4 +53,76 @@ class Route(db.Model):
             'vehicle_type': self.vehicle_type.value,
             'description': self.description,
             'is_active': self.is_active
-        }
\ No newline at end of file
+        }
+
+class Place(db.Model):
+    __tablename__ = "places"
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'name': self.name,
+            'lat': float(self.lat),
+            'lng': float(self.lng),
+        }
+
+class AuditEvent(db.Model):
+    __tablename__ = "audit_events"
+    __table_args__ = (
+        db.Index("ix_audit_events_row", "table_name", "row_id", "created_at"),
+    )
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.String(36))
+    action = db.Column(db.String(10), nullable=False)
+    actor_id = db.Column(db.String(36))
+    before = db.Column(db.JSON)
+    after = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'table_name': self.table_name,
+            'row_id': self.row_id,
+            'action': self.action,
+            'actor_id': self.actor_id,
+            'before': self.before,
+            'after': self.after,
+            'created_at': self.created_at.isoformat(),
+        }
+
+class FareVersion(db.Model):
+    __tablename__ = "fare_versions"
+    __table_args__ = (
+        db.Index("ix_fare_versions_route_effective", "route_id", "effective_from"),
+    )
+    
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    route_id = db.Column(UUID(as_uuid=True), db.ForeignKey("routes.id", ondelete="CASCADE"), nullable=False)
+    fare = db.Column(db.Float, nullable=False)
+    regular = db.Column(db.Float, nullable=False, default=0.0)
+    discount = db.Column(db.Float, nullable=False, default=0.0)
+    special = db.Column(db.Float, nullable=False, default=0.0)
+    # In effect until the route's next version starts
+    effective_from = db.Column(db.DateTime(timezone=True), nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'route_id': str(self.route_id),
+            'fare': float(self.fare),
+            'regular': float(self.regular),
+            'discount': float(self.discount),
+            'special': float(self.special),
+            'effective_from': self.effective_from.isoformat(),
+        }
@@ -0,0 +1,224 @@
+"""
+Lock-light schema changes for a live database.
+
+Used by both ``migrate_manual.py`` and Alembic revisions. Every helper takes
+a connection in autocommit mode, so each statement (or batch) commits on its
+own and no lock is held longer than one statement:
+
+* ``locked_ddl``   — DDL under ``lock_timeout``, retried with backoff when the
+  lock can't be had, instead of queueing behind (and blocking) live traffic
+* ``create_index`` — ``CREATE INDEX CONCURRENTLY``, dropping an invalid
+  leftover from an earlier failed build first; build progress is printed
+* ``backfill``     — a statement run over a table one key range at a time
+  (keyset pagination), with a pause between batches and the batch size
+  halved when batches run slow
+* ``add_column`` / ``backfill_column`` / ``set_not_null`` — the usual
+  nullable column, batched backfill, validated NOT NULL sequence
+
+Inside Alembic, wrap calls in ``op.get_context().autocommit_block()`` and
+pass ``op.get_bind()``. On SQLite the helpers fall back to plain statements.
+"""
+
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def settings():
+    return {
+        "lock_timeout": os.getenv("MIGRATION_LOCK_TIMEOUT", "3s"),
+        "retries": int(os.getenv("MIGRATION_LOCK_RETRIES", 10)),
+        "batch_size": int(os.getenv("MIGRATION_BATCH_SIZE", 1000)),
+        "batch_pause": float(os.getenv("MIGRATION_BATCH_PAUSE", 0.1)),
+        "max_batch_seconds": float(os.getenv("MIGRATION_MAX_BATCH_SECONDS", 1.0)),
+    }
+
+
+def autocommit(conn):
+    return conn.execution_options(isolation_level="AUTOCOMMIT")
+
+
+def _postgres(conn) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def is_lock_timeout(error) -> bool:
+    return getattr(getattr(error, "orig", None), "pgcode", None) == LOCK_NOT_AVAILABLE
+
+
+def set_lock_timeout(conn, timeout=None):
+    if _postgres(conn):
+        conn.execute(text(f"SET lock_timeout = '{timeout or settings()['lock_timeout']}'"))
+
+
+def with_lock_retry(label, fn, retries=None):
+    """Call ``fn()``; when it times out waiting for a lock, back off and retry"""
+    retries = settings()["retries"] if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except OperationalError as e:
+            if not is_lock_timeout(e) or attempt == retries:
+                raise
+            delay = min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"     {label}: lock not available, retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+# ── DDL ─────────────────────────────────
+def locked_ddl(conn, sql, label="DDL"):
+    """Run ``sql`` (one or more statements, applied atomically) under lock_timeout"""
+    set_lock_timeout(conn)
+    # Sent as one query, a multi-statement string is one implicit transaction
+    return with_lock_retry(label, lambda: conn.exec_driver_sql(sql))
+
+
+def create_index(conn, name, table, columns, unique=False):
+    """Build an index without blocking writes (CONCURRENTLY on Postgres)"""
+    cols = ", ".join(columns)
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if not _postgres(conn):
+        conn.exec_driver_sql(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({cols})")
+        return
+
+    def build():
+        # A failed concurrent build leaves an INVALID index behind; start over
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})")
+
+    set_lock_timeout(conn)
+    stop = threading.Event()
+    watcher = threading.Thread(target=_report_index_progress, args=(conn.engine, name, stop), daemon=True)
+    watcher.start()
+    try:
+        with_lock_retry(f"index {name}", build)
+    finally:
+        stop.set()
+        watcher.join()
+
+
+def _report_index_progress(engine, name, stop, interval=5.0):
+    """Print pg_stat_progress_create_index for ``name`` until ``stop`` is set"""
+    while not stop.wait(interval):
+        try:
+            with engine.connect() as conn:
+                row = conn.execute(text(
+                    "SELECT p.phase, p.blocks_done, p.blocks_total, p.tuples_done, p.tuples_total "
+                    "FROM pg_stat_progress_create_index p "
+                    "JOIN pg_class c ON c.oid = p.index_relid WHERE c.relname = :name"
+                ), {"name": name}).first()
+        except Exception:
+            return
+        if row:
+            done, total = (row.blocks_done, row.blocks_total) if row.blocks_total else (row.tuples_done, row.tuples_total)
+            pct = f" {100 * done / total:.0f}%" if total else ""
+            print(f"     index {name}: {row.phase}{pct}")
+
+
+# ── Backfills ───────────────────────────
+def backfill(conn, table, sql, label, key="id", params=None):
+    """Run ``sql`` over ``table`` in batches of consecutive ``key`` values.
+
+    ``sql`` must restrict itself to rows with
+    ``(:after IS NULL OR key > :after) AND key <= :upper``; ``:after`` is NULL
+    for the first batch. Ranges come from keyset pagination on ``key`` (no
+    ``min``/``max``, which Postgres doesn't define for UUIDs), so each batch
+    reads only its own rows and every row is visited exactly once, whether
+    or not the statement changed it. Each batch commits on its own, is
+    followed by a pause, and halves the batch size if it took longer than
+    MIGRATION_MAX_BATCH_SECONDS (growing back when fast).
+    Returns the number of rows the statement touched.
+    """
+    config = settings()
+    batch_size = max_batch = config["batch_size"]
+    set_lock_timeout(conn)
+    statement = text(sql)
+    total = count(conn, f"SELECT count(*) FROM {table}")
+    scanned = touched = 0
+    after = None
+    started = time.monotonic()
+
+    while True:
+        batch_started = time.monotonic()
+        where = f"WHERE {key} > :after" if after is not None else ""
+        bounds = {"after": after} if after is not None else {}
+        rows = batch_size
+        upper = conn.execute(text(
+            f"SELECT {key} FROM {table} {where} ORDER BY {key} LIMIT 1 OFFSET :skip"
+        ), {**bounds, "skip": batch_size - 1}).scalar()
+        if upper is None:
+            # Fewer than a full batch left: run to the last key
+            upper = conn.execute(text(f"SELECT {key} FROM {table} {where} ORDER BY {key} DESC LIMIT 1"), bounds).scalar()
+            if upper is None:
+                break
+            rows = count(conn, f"SELECT count(*) FROM {table} {where}", bounds)
+
+        result = with_lock_retry(label, lambda: conn.execute(statement, {**(params or {}), "after": after, "upper": upper}))
+        touched += max(result.rowcount, 0)
+        scanned += rows
+        after = upper
+        elapsed = time.monotonic() - batch_started
+
+        rate = scanned / max(time.monotonic() - started, 1e-6)
+        progress = f"{scanned}/{total} ({100 * scanned / total:.0f}%)" if total else f"{scanned}"
+        eta = f", ~{(total - scanned) / rate:.0f}s left" if total and scanned < total else ""
+        print(f"     {label}: {progress} rows scanned, {touched} written, {rate:.0f} rows/s{eta}")
+
+        if elapsed > config["max_batch_seconds"]:
+            batch_size = max(1, batch_size // 2)
+        elif elapsed < config["max_batch_seconds"] / 4:
+            batch_size = min(max_batch, batch_size * 2)
+        time.sleep(config["batch_pause"])
+
+    return touched
+
+
+def count(conn, sql, params=None) -> int:
+    return conn.execute(text(sql), params or {}).scalar() or 0
+
+
+# ── New columns ─────────────────────────
+def add_column(conn, table, column_ddl):
+    """Add a column without a table rewrite (nullable, constant default only)"""
+    if_not_exists = "IF NOT EXISTS " if _postgres(conn) else ""
+    locked_ddl(conn, f"ALTER TABLE {table} ADD COLUMN {if_not_exists}{column_ddl}", f"add column to {table}")
+
+
+def backfill_column(conn, table, column, expression):
+    """Fill ``column`` where it is NULL, a batch of rows at a time"""
+    return backfill(
+        conn,
+        table,
+        f"UPDATE {table} SET {column} = {expression} "
+        f"WHERE (:after IS NULL OR id > :after) AND id <= :upper AND {column} IS NULL",
+        f"backfill {table}.{column}",
+    )
+
+
+def set_not_null(conn, table, column):
+    """SET NOT NULL without a long exclusive lock.
+
+    A NOT VALID check is added instantly and validated under a weaker lock;
+    Postgres then uses it to skip the full scan SET NOT NULL would do.
+    """
+    if not _postgres(conn):
+        return
+    check = f"{table}_{column}_not_null"
+    locked_ddl(conn, f"""
+        DO $$ BEGIN
+            ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({column} IS NOT NULL) NOT VALID;
+        EXCEPTION WHEN duplicate_object THEN null; END $$;
+    """, f"check {check}")
+    with_lock_retry(f"validate {check}", lambda: conn.exec_driver_sql(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}"))
+    locked_ddl(conn, f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL; ALTER TABLE {table} DROP CONSTRAINT {check}", f"not null {table}.{column}")
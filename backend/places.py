@@ -0,0 +1,145 @@
+"""
+Nearest boarding point lookup.
+
+Places with coordinates are bucketed into a uniform lat/lng grid. A query
+scans rings of cells outward from its own cell and stops as soon as the k-th
+best distance is closer than anything an unvisited ring could hold, so only
+a handful of cells are touched per lookup. One index is kept per vehicle type
+(plus one for any type), containing only places that are the origin of an
+active route.
+"""
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from cache_bus import CachedSnapshot
+from fare_matrix import normalize_place
+from models import db, Place, Route
+
+CELL_DEG = 0.05  # ~5.5 km at the equator
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+ANY_VEHICLE = None
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distances from one point to arrays of points (all in degrees)"""
+    lat, lng = math.radians(lat), math.radians(lng)
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + math.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class PlaceIndex:
+    """Immutable grid index over a set of places"""
+
+    def __init__(self, places, route_counts):
+        self.places = places
+        self.route_counts = route_counts
+        self.lats = np.array([p["lat"] for p in places], dtype=np.float64)
+        self.lngs = np.array([p["lng"] for p in places], dtype=np.float64)
+
+        buckets = defaultdict(list)
+        for i, (lat, lng) in enumerate(zip(self.lats, self.lngs)):
+            buckets[self._cell(lat, lng)].append(i)
+        self.cells = {cell: np.array(ids, dtype=np.intp) for cell, ids in buckets.items()}
+
+    @staticmethod
+    def _cell(lat, lng):
+        return math.floor(lat / CELL_DEG), math.floor(lng / CELL_DEG)
+
+    def nearest(self, lat: float, lng: float, k: int = 5):
+        """The ``k`` closest places as (index, distance_km) pairs, nearest first"""
+        if not self.places:
+            return []
+        k = min(k, len(self.places))
+        ci, cj = self._cell(lat, lng)
+
+        found = []
+        visited = 0
+        ring = 0
+        while True:
+            for cell in self._ring(ci, cj, ring):
+                ids = self.cells.get(cell)
+                if ids is not None:
+                    found.append(ids)
+            visited += 8 * ring or 1
+
+            # Sparse data or a far-away query: scanning everything is cheaper
+            if visited > len(self.cells):
+                return self._closest(lat, lng, np.arange(len(self.places)), k)
+
+            if found and sum(len(ids) for ids in found) >= k:
+                candidates = np.concatenate(found)
+                best = self._closest(lat, lng, candidates, k)
+                # Anything outside the rings scanned so far is at least this far away
+                lat_edge = min(90.0, abs(lat) + (ring + 1) * CELL_DEG)
+                bound = ring * CELL_DEG * KM_PER_DEG * math.cos(math.radians(lat_edge))
+                if best[-1][1] <= bound:
+                    return best
+            ring += 1
+
+    @staticmethod
+    def _ring(ci, cj, r):
+        if r == 0:
+            yield ci, cj
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
+
+    def _closest(self, lat, lng, candidates, k):
+        distances = haversine_km(lat, lng, self.lats[candidates], self.lngs[candidates])
+        order = np.argsort(distances)[:k]
+        return [(int(candidates[i]), float(distances[i])) for i in order]
+
+
+def _load_place_indexes():
+    """One PlaceIndex per vehicle type, keyed by its value (None for any)"""
+    coords = {normalize_place(p.name): p.to_dict() for p in Place.query.all()}
+
+    counts = defaultdict(lambda: defaultdict(int))
+    rows = (
+        db.session.query(Route.origin, Route.vehicle_type)
+        .filter(Route.is_active.is_(True))
+        .all()
+    )
+    for origin, vehicle_type in rows:
+        key = normalize_place(origin)
+        if key in coords:
+            counts[vehicle_type.value][key] += 1
+            counts[ANY_VEHICLE][key] += 1
+
+    indexes = {}
+    for vehicle, per_place in counts.items():
+        names = sorted(per_place)
+        indexes[vehicle] = PlaceIndex(
+            [coords[name] for name in names],
+            [per_place[name] for name in names],
+        )
+    return indexes
+
+
+place_indexes = CachedSnapshot(_load_place_indexes, Route.__tablename__, Place.__tablename__)
+
+
+def nearest_places(lat: float, lng: float, vehicle_type=ANY_VEHICLE, limit: int = 5):
+    index = place_indexes.get().get(vehicle_type)
+    if index is None:
+        return []
+    return [
+        {
+            **index.places[i],
+            "distance_km": round(distance, 3),
+            "route_count": index.route_counts[i],
+        }
+        for i, distance in index.nearest(lat, lng, limit)
+    ]
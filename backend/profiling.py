@@ -0,0 +1,288 @@
+"""
+On-demand profiling for admins.
+
+An admin request carrying ``X-Profile: sample`` (wall-clock stack sampling) or
+``X-Profile: trace`` (deterministic, every call timed via ``sys.setprofile``)
+is profiled from the start of the request to its response; the profile id
+comes back in ``X-Profile-Id``. ``start_window()`` samples every thread of
+the worker for a fixed time instead.
+
+Profiles are written to ``PROFILE_DIR`` (a temp directory by default), which
+every worker on the host shares, so any worker can serve any profile. Only
+the newest ``PROFILE_BUFFER_SIZE`` are kept. They are exported as collapsed
+stacks (flamegraph.pl / speedscope text) or speedscope JSON. Without the
+header the only cost is one header lookup per request.
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import g, request
+
+MODES = ("sample", "trace")
+MAX_STACK_DEPTH = 200
+PROFILE_ID = re.compile(r"^[0-9a-f]{12}$")
+
+
+def _frame_key(code):
+    return code.co_name, code.co_filename, code.co_firstlineno
+
+
+def _stack(frame):
+    """Root-first tuple of frame keys"""
+    keys = []
+    while frame is not None and len(keys) < MAX_STACK_DEPTH:
+        keys.append(_frame_key(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(keys))
+
+
+class Sampler:
+    """Samples the stacks of some (or all other) threads at a fixed interval"""
+
+    unit = "samples"
+
+    def __init__(self, thread_ids=None, interval=0.001):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me or (self.thread_ids is not None and tid not in self.thread_ids):
+                    continue
+                self.stacks[_stack(frame)] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+class Tracer:
+    """Deterministic profiler for the current thread; weights are self time in µs"""
+
+    unit = "microseconds"
+
+    def __init__(self):
+        self.stacks = Counter()
+        self._stack = []
+        self._last = 0
+
+    def start(self):
+        self._last = time.perf_counter_ns()
+        sys.setprofile(self._hook)
+
+    def _hook(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        if self._stack:
+            self.stacks[tuple(self._stack)] += now - self._last
+        if event == "call":
+            self._stack.append(_frame_key(frame.f_code))
+        elif event == "c_call":
+            self._stack.append((getattr(arg, "__qualname__", repr(arg)), "<builtin>", 0))
+        elif self._stack:
+            self._stack.pop()
+        self._last = time.perf_counter_ns()
+
+    def stop(self):
+        sys.setprofile(None)
+        return Counter({stack: ns // 1000 for stack, ns in self.stacks.items() if ns >= 1000})
+
+
+# ── Export formats ───────────────────────
+def _frame_name(key):
+    name, filename, line = key
+    return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+
+def to_collapsed(profile) -> str:
+    return "\n".join(
+        ";".join(_frame_name(key) for key in stack) + f" {weight}"
+        for stack, weight in profile["stacks"].items()
+    ) + "\n"
+
+
+def to_speedscope(profile) -> dict:
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, weight in profile["stacks"].items():
+        ids = []
+        for key in stack:
+            if key not in index:
+                index[key] = len(frames)
+                name, filename, line = key
+                frames.append({"name": name, "file": filename, "line": line})
+            ids.append(index[key])
+        samples.append(ids)
+        weights.append(weight)
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": profile["name"],
+            "unit": "microseconds" if profile["unit"] == "microseconds" else "none",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": profile["name"],
+        "exporter": "lagona-backend",
+    }
+
+
+# ── Profile store ────────────────────────
+class Profiler:
+    def __init__(self):
+        self.directory = None
+        self.capacity = 20
+        self._lock = threading.Lock()
+        self._authorize = None
+
+    def init_app(self, app, authorize):
+        """``authorize()`` returns True when the current request comes from an admin"""
+        self.directory = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "lagona-profiles")
+        self.capacity = int(os.getenv("PROFILE_BUFFER_SIZE", 20))
+        self._authorize = authorize
+
+        @app.before_request
+        def _start_profile():
+            mode = request.headers.get("X-Profile")
+            if mode is None:
+                return None
+            if mode not in MODES:
+                return {"message": f"X-Profile must be one of: {', '.join(MODES)}"}, 400
+            if not self._authorize():
+                return {"message": "Admin access required"}, 403
+            profiler = Tracer() if mode == "trace" else Sampler({threading.get_ident()})
+            g.profile = (profiler, mode, time.perf_counter())
+            profiler.start()
+            return None
+
+        @app.after_request
+        def _finish_profile(response):
+            entry = self._finish()
+            if entry:
+                response.headers["X-Profile-Id"] = entry["id"]
+            return response
+
+        @app.teardown_request
+        def _abandon_profile(exc):
+            # Only still running if the request blew up before after_request
+            self._finish()
+
+    def _finish(self):
+        running = g.pop("profile", None)
+        if running is None:
+            return None
+        profiler, mode, started = running
+        stacks = profiler.stop()
+        return self._store(f"{request.method} {request.path}", mode, profiler.unit, started, stacks)
+
+    def _store(self, name, mode, unit, started, stacks, profile_id=None):
+        entry = {
+            "id": profile_id or uuid.uuid4().hex[:12],
+            "name": name,
+            "mode": mode,
+            "unit": unit,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        # Stacks first: a profile exists once its metadata file does
+        self._write(f"{entry['id']}.stacks.json", [[list(map(list, stack)), weight] for stack, weight in stacks.items()])
+        self._write(f"{entry['id']}.json", entry)
+        self._prune()
+        return entry
+
+    def _write(self, filename, data):
+        path = os.path.join(self.directory, filename)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _metadata_files(self):
+        """Metadata file paths, newest first"""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json") and not n.endswith(".stacks.json")]
+        except FileNotFoundError:
+            return []
+        paths = [os.path.join(self.directory, n) for n in names]
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except FileNotFoundError:
+                pass
+        return sorted(mtimes, key=mtimes.get, reverse=True)
+
+    def _prune(self):
+        with self._lock:
+            for path in self._metadata_files()[self.capacity:]:
+                for stale in (path, path[:-len(".json")] + ".stacks.json"):
+                    try:
+                        os.remove(stale)
+                    except FileNotFoundError:
+                        pass
+
+    def start_window(self, seconds: float, interval: float = 0.001) -> str:
+        """Sample every thread in this worker for ``seconds``; returns the profile id"""
+        profile_id = uuid.uuid4().hex[:12]
+
+        def run():
+            sampler = Sampler(interval=interval)
+            started = time.perf_counter()
+            sampler.start()
+            time.sleep(seconds)
+            self._store(f"window {seconds}s", "window", sampler.unit, started, sampler.stop(), profile_id)
+
+        threading.Thread(target=run, name="profile-window", daemon=True).start()
+        return profile_id
+
+    def list(self):
+        entries = []
+        for path in self._metadata_files():
+            try:
+                with open(path) as f:
+                    entries.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                pass
+        return entries
+
+    def get(self, profile_id):
+        if not self.directory or not PROFILE_ID.match(profile_id):
+            return None
+        base = os.path.join(self.directory, profile_id)
+        try:
+            with open(base + ".json") as f:
+                entry = json.load(f)
+            with open(base + ".stacks.json") as f:
+                stacks = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        entry["stacks"] = Counter({tuple(map(tuple, stack)): weight for stack, weight in stacks})
+        return entry
+
+
+profiler = Profiler()
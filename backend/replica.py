@@ -0,0 +1,181 @@
+"""
+Optional read-replica routing.
+
+When ``REPLICA_URL`` is set it is registered as the ``replica`` bind, and plain
+SELECTs issued by GET requests under ``/api/routes`` and ``/api/users`` go to
+it. Everything else — writes, locking reads, auth lookups — stays on the
+primary.
+
+Read-your-writes: a successful write pins that client to the primary for
+``REPLICA_PIN_SECONDS``. The pin is kept in-process and also handed back to
+the client, which sends it on later requests so every worker honours it. It
+comes back as the ``X-Primary-Until`` header, which cross-origin callers echo
+back, and as a cookie for same-origin callers. A lag guard sends reads back to the primary while the replica
+is more than ``REPLICA_MAX_LAG_SECONDS`` behind or failing.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = "replica"
+PIN_COOKIE = "lagona_primary_until"
+PIN_HEADER = "X-Primary-Until"
+READ_PREFIXES = ("/api/routes", "/api/users")
+
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+@contextmanager
+def primary_reads():
+    """Send reads in this block to the primary, even inside a replica-routed GET"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get("read_from_replica")
+    g.read_from_replica = False
+    try:
+        yield
+    finally:
+        g.read_from_replica = previous
+
+
+class RoutingSession(Session):
+    """Session that sends replica-eligible SELECTs to the ``replica`` bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+            and has_request_context()
+            and g.get("read_from_replica")
+        ):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    lag_check_interval = 5.0
+
+    def __init__(self):
+        self.enabled = False
+        self._pins = {}
+        self._pins_lock = threading.Lock()
+        self._healthy = True
+        self._checked_at = 0.0
+        self._check_lock = threading.Lock()
+
+    def init_app(self, app, db):
+        if REPLICA_BIND not in app.config.get("SQLALCHEMY_BINDS", {}):
+            return
+
+        self.enabled = True
+        self.db = db
+        self.pin_seconds = float(os.getenv("REPLICA_PIN_SECONDS", 5))
+        self.max_lag = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 2))
+
+        with app.app_context():
+            self.engine = db.engines[REPLICA_BIND]
+
+        @event.listens_for(self.engine, "handle_error")
+        def _replica_error(context):
+            # Fall back to the primary until the next lag check clears it
+            self._healthy = False
+            self._checked_at = time.monotonic()
+
+        @app.before_request
+        def _choose_read_source():
+            g.read_from_replica = (
+                request.method in ("GET", "HEAD")
+                and request.path.startswith(READ_PREFIXES)
+                and not self.is_pinned()
+                and self.replica_healthy()
+            )
+
+        @app.after_request
+        def _pin_after_write(response):
+            if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+                self.pin(response)
+            response.headers["X-Read-Source"] = "replica" if g.get("read_from_replica") else "primary"
+            return response
+
+    # ── Read-your-writes ────────────────────
+    def client_key(self) -> str:
+        ident = request.headers.get("Authorization")
+        if not ident:
+            ident = request.remote_addr
+        return hashlib.sha1(str(ident).encode()).hexdigest()
+
+    def pin(self, response):
+        until = time.time() + self.pin_seconds
+        key = self.client_key()
+        # Other request threads add pins while we prune
+        with self._pins_lock:
+            if len(self._pins) > 10000:
+                now = time.time()
+                self._pins = {k: v for k, v in self._pins.items() if v > now}
+            self._pins[key] = until
+        response.headers[PIN_HEADER] = f"{until:.3f}"
+        response.set_cookie(
+            PIN_COOKIE,
+            f"{until:.3f}",
+            max_age=math.ceil(self.pin_seconds),
+            httponly=True,
+            secure=request.is_secure,
+            samesite="None" if request.is_secure else "Lax",
+        )
+
+    def is_pinned(self) -> bool:
+        now = time.time()
+        for value in (request.headers.get(PIN_HEADER), request.cookies.get(PIN_COOKIE)):
+            try:
+                # Never pinned longer than a real pin could last
+                if now < float(value or 0) <= now + self.pin_seconds:
+                    return True
+            except ValueError:
+                pass
+        key = self.client_key()
+        with self._pins_lock:
+            return self._pins.get(key, 0) > now
+
+    # ── Lag guard ───────────────────────────
+    def replica_healthy(self) -> bool:
+        if time.monotonic() - self._checked_at < self.lag_check_interval:
+            return self._healthy
+        # One worker thread refreshes; the rest use the last answer
+        if not self._check_lock.acquire(blocking=False):
+            return self._healthy
+        try:
+            self._healthy = self.replica_lag() <= self.max_lag
+        except Exception as e:
+            print(f"Replica lag check failed: {str(e)}")
+            self._healthy = False
+        finally:
+            self._checked_at = time.monotonic()
+            self._check_lock.release()
+        return self._healthy
+
+    def replica_lag(self) -> float:
+        if self.engine.dialect.name != "postgresql":
+            return 0.0
+        with self.engine.connect() as conn:
+            return float(conn.execute(text(REPLICA_LAG_SQL)).scalar() or 0)
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,235 @@
+"""
+Slow-query sentinel.
+
+Every statement on the app's engines is timed with cursor events. Statements
+slower than ``SLOW_QUERY_MS`` are normalized (literals and bound parameters
+become ``?``, ``IN`` lists collapse) and aggregated by fingerprint, together
+with their bound-parameter shapes and the resource that issued them.
+
+The first time a fingerprint turns slow, and again every
+``SLOW_QUERY_EXPLAIN_INTERVAL`` seconds, its plan is captured on the same
+connection inside a savepoint. A ``SLOW_QUERY_ANALYZE_RATE`` share of those
+captures use ``EXPLAIN ANALYZE`` (SELECTs only, so nothing is written twice).
+
+Aggregates are per worker process.
+"""
+
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+_START = "slow_query_start"
+
+_STRING = re.compile(r"'(?:''|[^'])*'")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+# Only plain SELECTs are ever ANALYZEd: a WITH can wrap a write
+# (update_returning's locking CTE does), and ANALYZE would run it again
+READ_ONLY = ("select",)
+EXPLAINABLE = READ_ONLY + ("with", "insert", "update", "delete")
+
+
+def normalize_sql(statement: str) -> str:
+    sql = _STRING.sub("?", statement)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(?...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.lower().encode()).hexdigest()[:16]
+
+
+def _shape(value):
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def param_shape(parameters, executemany=False):
+    """Types (and lengths) of the bound parameters, never their values"""
+    if executemany:
+        rows = list(parameters or [])
+        return {"rows": len(rows), "row": param_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: _shape(value) for key, value in parameters.items()}
+    return [_shape(value) for value in parameters or ()]
+
+
+def calling_resource() -> str:
+    if has_request_context():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        return f"{request.method} {rule}"
+    return threading.current_thread().name
+
+
+class SlowQuerySentinel:
+    max_resources = 5
+
+    def __init__(self):
+        self.threshold_ms = 0.0
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.statements = 0
+
+    def init_app(self, app, db):
+        self.threshold_ms = float(os.getenv("SLOW_QUERY_MS", 250))
+        self.analyze_rate = float(os.getenv("SLOW_QUERY_ANALYZE_RATE", 0))
+        self.explain_interval = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+        self.max_fingerprints = int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", 500))
+        if self.threshold_ms <= 0:
+            return
+
+        with app.app_context():
+            engines = list(db.engines.values())
+
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before)
+            event.listen(engine, "after_cursor_execute", self._after)
+            event.listen(engine, "handle_error", self._error)
+
+    # ── Timing ──────────────────────────────
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_START, []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info[_START].pop()) * 1000
+        self.statements += 1
+        if elapsed_ms < self.threshold_ms:
+            return
+        try:
+            self._observe(conn, statement, parameters, executemany, elapsed_ms)
+        except Exception as e:
+            print(f"Slow query capture failed: {str(e)}")
+
+    def _error(self, context):
+        # A failed statement never reaches _after; drop its start time so it
+        # doesn't stay on the pooled connection
+        conn = context.connection
+        starts = conn.info.get(_START) if conn is not None else None
+        if starts:
+            starts.pop()
+
+    def _observe(self, conn, statement, parameters, executemany, elapsed_ms):
+        normalized = normalize_sql(statement)
+        key = fingerprint(normalized)
+        now = time.time()
+        resource = calling_resource()
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # Make room by forgetting the entry that has cost the least
+                    del self._stats[min(self._stats, key=lambda k: self._stats[k]["total_ms"])]
+                stats = self._stats[key] = {
+                    "fingerprint": key,
+                    "statement": normalized,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "resources": {},
+                    "plan": None,
+                    "plan_analyzed": False,
+                    "plan_captured_at": 0.0,
+                }
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["last_seen"] = now
+            stats["param_shape"] = param_shape(parameters, executemany)
+            resources = stats["resources"]
+            if resource in resources or len(resources) < self.max_resources:
+                resources[resource] = resources.get(resource, 0) + 1
+
+            explain = not executemany and now - stats["plan_captured_at"] >= self.explain_interval
+            if explain:
+                # Claim the capture so concurrent repeats don't all EXPLAIN
+                stats["plan_captured_at"] = now
+
+        if explain:
+            verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+            if verb in EXPLAINABLE:
+                analyze = verb in READ_ONLY and random.random() < self.analyze_rate
+                plan = self.explain(conn, statement, parameters, analyze)
+                with self._lock:
+                    stats["plan"] = plan
+                    stats["plan_analyzed"] = analyze
+
+    # ── Plans ───────────────────────────────
+    def explain(self, conn, statement, parameters, analyze=False):
+        """Plan for ``statement`` on this connection; any effect is rolled back"""
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        elif dialect == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            return None
+
+        raw = conn.connection.dbapi_connection
+        # Savepoint only inside a transaction (psycopg2 outside autocommit)
+        savepoint = dialect == "postgresql" and not getattr(raw, "autocommit", False)
+        # A raw DBAPI cursor, so the EXPLAIN itself isn't timed or captured
+        cursor = raw.cursor()
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            finally:
+                if savepoint:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                    cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        finally:
+            cursor.close()
+
+        if dialect == "sqlite":
+            return "\n".join(str(row[-1]) for row in rows)
+        return "\n".join(row[0] for row in rows)
+
+    # ── Report ──────────────────────────────
+    def report(self, limit=20, order_by="total_ms"):
+        with self._lock:
+            entries = sorted(self._stats.values(), key=lambda s: s[order_by], reverse=True)[:limit]
+            return {
+                "threshold_ms": self.threshold_ms,
+                "statements_timed": self.statements,
+                "fingerprints": len(self._stats),
+                "top": [
+                    {
+                        "fingerprint": s["fingerprint"],
+                        "statement": s["statement"],
+                        "count": s["count"],
+                        "total_ms": round(s["total_ms"], 3),
+                        "mean_ms": round(s["total_ms"] / s["count"], 3),
+                        "max_ms": round(s["max_ms"], 3),
+                        "last_seen": datetime.fromtimestamp(s["last_seen"], timezone.utc).isoformat(),
+                        "param_shape": s["param_shape"],
+                        "resources": s["resources"],
+                        "plan": s["plan"],
+                        "plan_analyzed": s["plan_analyzed"],
+                    }
+                    for s in entries
+                ],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.statements = 0
+
+
+slow_queries = SlowQuerySentinel()
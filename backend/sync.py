@@ -0,0 +1,92 @@
+"""
+Delta sync for client-side copies of the route catalog.
+
+A sync version is the route ``updated_at`` watermark encoded as integer
+microseconds since the epoch. Deleted routes stay behind as tombstones
+(``is_active = false``) so clients can learn about deletions; tombstones older
+than the retention window are compacted away, and clients whose version is
+older than that window are told to reset and reload the full catalog.
+
+``updated_at`` is stamped before commit, so a slow transaction can commit a
+row older than what a client has already synced past. The returned version
+is therefore never newer than ``now - SYNC_SAFETY_MARGIN_SECONDS``: rows from
+that window are sent again on the next sync (clients apply upserts
+idempotently), and late commits inside it are not missed.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+from models import db, Route
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def tombstone_retention() -> timedelta:
+    return timedelta(days=int(os.getenv("TOMBSTONE_RETENTION_DAYS", 30)))
+
+
+def safety_margin() -> timedelta:
+    return timedelta(seconds=float(os.getenv("SYNC_SAFETY_MARGIN_SECONDS", 30)))
+
+
+def to_version(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    delta = ts - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_version(version: int) -> datetime:
+    return EPOCH + timedelta(microseconds=version)
+
+
+# Largest version that still maps to a datetime
+MAX_VERSION = to_version(datetime.max.replace(tzinfo=timezone.utc))
+
+
+def route_changes(since: int) -> dict:
+    """Routes created, updated or deleted after the ``since`` version"""
+    now = datetime.now(timezone.utc)
+    horizon = now - tombstone_retention()
+    reset = since <= 0 or from_version(since) < horizon
+
+    query = Route.query
+    if reset:
+        # Full reload: tombstones are meaningless to a client starting over
+        query = query.filter(Route.is_active.is_(True))
+    else:
+        query = query.filter(Route.updated_at > from_version(since))
+
+    routes = query.order_by(Route.updated_at).all()
+
+    version = max(since, 0)
+    upserts, deletes = [], []
+    for route in routes:
+        version = max(version, to_version(route.updated_at))
+        if route.is_active:
+            upserts.append(route.to_dict())
+        else:
+            deletes.append(str(route.id))
+
+    # Rescan the recent window next time in case a transaction commits late
+    version = min(version, to_version(now - safety_margin()))
+
+    return {
+        "version": str(version),
+        "reset": reset,
+        "upserts": upserts,
+        "deletes": deletes,
+    }
+
+
+def compact_tombstones() -> int:
+    """Hard-delete tombstones older than the retention window"""
+    horizon = datetime.now(timezone.utc) - tombstone_retention()
+    removed = (
+        Route.query
+        .filter(Route.is_active.is_(False), Route.updated_at < horizon)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    return removed
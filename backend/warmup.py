@@ -0,0 +1,161 @@
+"""
+Pre-fork preload and per-worker warm-up for the production server
+(``gunicorn -c gunicorn.conf.py app:app``).
+
+``preload()`` runs once in the gunicorn master. It builds the route-catalog
+snapshots (fare matrix, fare timeline and place indexes, all arrays or tuples
+over the active routes) and the Swagger spec. It then closes every pooled
+connection and freezes the GC, so the workers share those pages
+copy-on-write instead of each building its own copy.
+
+``start()`` runs in each worker after fork. The cache bus drops every
+snapshot when it starts listening, so the worker re-adopts the inherited
+snapshots if the catalog hasn't changed since the preload. It then fills its
+connection pool and sends one request through the stack. ``GET /ready``
+answers 503 until that is done.
+"""
+
+import gc
+import os
+import threading
+import time
+
+from sqlalchemy import func, text
+
+from cache_bus import cache_bus
+from fare_matrix import fare_matrix
+from fare_versions import fare_timeline
+from models import FareVersion, Place, Route
+from places import place_indexes
+
+CATALOG_SNAPSHOTS = (fare_matrix, fare_timeline, place_indexes)
+
+
+def catalog_stamp(session):
+    """Cheap fingerprint of the tables the catalog snapshots are built from"""
+    return tuple(
+        tuple(session.query(func.count(), func.max(column)).one())
+        for column in (Route.updated_at, Place.updated_at, FareVersion.created_at)
+    )
+
+
+class Warmup:
+    bus_wait = 10.0
+
+    def __init__(self):
+        self.app = None
+        self.ready = threading.Event()
+        self._preloaded = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, api):
+        self.app = app
+        self.db = db
+        self.api = api
+
+        @app.get("/ready")
+        def readiness():
+            # Outside gunicorn nothing has warmed this process yet
+            if self._pid != os.getpid():
+                self.start(background=False)
+            if not self.ready.is_set():
+                return {"status": "warming", "pid": os.getpid()}, 503
+            return {"status": "ready", "pid": os.getpid()}, 200
+
+    # ── Master, before fork ─────────────────
+    def preload(self):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                try:
+                    stamp = catalog_stamp(self.db.session)
+                    values = [snapshot.get() for snapshot in CATALOG_SNAPSHOTS]
+                    self.db.session.remove()
+                    with self.app.test_request_context():
+                        self.api.__schema__
+                finally:
+                    # Workers must not inherit open sockets
+                    for engine in self.db.engines.values():
+                        engine.dispose()
+        except Exception as e:
+            print(f"Preload failed: {str(e)}")
+            # Workers start cold and warm lazily, like a failed warm()
+            self._preloaded = None
+            return
+
+        self._preloaded = (stamp, values)
+        gc.collect()
+        gc.freeze()
+        print(f"Preloaded route catalog in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    # ── Worker, after fork ──────────────────
+    def start(self, background=True, connections=None):
+        """Warm this process once; safe to call again after fork"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.ready = threading.Event()
+
+        if background:
+            threading.Thread(target=self.warm, args=(connections,), name="warmup", daemon=True).start()
+        else:
+            self.warm(connections)
+
+    def warm(self, connections=None):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                if self._preloaded is not None:
+                    for engine in self.db.engines.values():
+                        # Drop any pool inherited from the master without closing its sockets
+                        engine.dispose(close=False)
+                    self._adopt_snapshots()
+                for engine in self.db.engines.values():
+                    self._fill_pool(engine, connections)
+                self.db.session.remove()
+
+            with self.app.test_client() as client:
+                client.get("/api/routes?page=1&limit=10")
+
+            self.ready.set()
+            print(f"Worker {os.getpid()} warmed up in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            print(f"Warm-up failed in worker {os.getpid()}: {str(e)}")
+            # Serve anyway; everything warms lazily on first use
+            self.ready.set()
+
+    def _adopt_snapshots(self):
+        """Keep the master's snapshots if nothing changed since the preload"""
+        stamp, values = self._preloaded
+        self._preloaded = None
+
+        if cache_bus.transport is not None:
+            cache_bus.start()
+            if not cache_bus.listening.wait(self.bus_wait):
+                return
+        generations = [snapshot.generation for snapshot in CATALOG_SNAPSHOTS]
+        current = catalog_stamp(self.db.session)
+        self.db.session.remove()
+        if current != stamp:
+            return
+        for snapshot, value, generation in zip(CATALOG_SNAPSHOTS, values, generations):
+            snapshot.prime(value, generation)
+
+    @staticmethod
+    def _fill_pool(engine, connections=None):
+        size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+        count = min(connections or size, size)
+        opened = []
+        try:
+            for _ in range(count):
+                conn = engine.connect()
+                opened.append(conn)
+                conn.execute(text("SELECT 1"))
+        finally:
+            for conn in opened:
+                conn.close()
+
+
+warmup = Warmup()
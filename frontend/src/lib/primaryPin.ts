@@ -0,0 +1,27 @@
+import type { AxiosInstance } from "axios"
+
+const STORAGE_KEY = "lagona_primary_until"
+const HEADER = "X-Primary-Until"
+
+// After a write the API answers with X-Primary-Until; sending it back keeps
+// this tab's reads on the primary database (not a lagging replica) until then,
+// whichever server worker handles them.
+export function installPrimaryPin(instance: AxiosInstance) {
+  instance.interceptors.request.use((config) => {
+    const until = Number(sessionStorage.getItem(STORAGE_KEY))
+    if (until * 1000 > Date.now()) {
+      config.headers.set(HEADER, String(until))
+    }
+    return config
+  })
+
+  instance.interceptors.response.use((response) => {
+    const until = response.headers[HEADER.toLowerCase()]
+    if (until) {
+      sessionStorage.setItem(STORAGE_KEY, String(until))
+    }
+    return response
+  })
+
+  return instance
+}
@@ -3,6 +3,10 @@ import { createRoot } from 'react-dom/client'
 import './index.css'
 import App from './App.tsx'
 import { BrowserRouter } from 'react-router-dom'
+import axios from 'axios'
+import { installPrimaryPin } from './lib/primaryPin'
+
+installPrimaryPin(axios)
 
 createRoot(document.getElementById('root')!).render(
   <StrictMode>
@@ -1,4 +1,5 @@
 import axios from "axios"
+import { installPrimaryPin } from "@/lib/primaryPin"
 import { useEffect, useState } from "react"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Button } from "@/components/ui/button"
@@ -80,10 +81,10 @@ export default function Dashboard() {
     }
 
     try {
-      const api = axios.create({
+      const api = installPrimaryPin(axios.create({
         baseURL: "https://lagona-oz9x.vercel.app/api",
         headers: { Authorization: `Bearer ${token}` },
-      })
+      }))
 
       const [routesRes, usersRes] = await Promise.all([
         api.get("/routes"),
@@ -338,6 +338,14 @@ export default function Routes_manages() {
     return () => clearTimeout(timer)
   }, [searchQuery])
 
+  // ── Admin token ───────────────────────────────────────────────────────────
+  // Attributes writes to this admin and puts every request from this page in
+  // the admin traffic class instead of the rate-limited public one
+  const authConfig = () => {
+    const token = localStorage.getItem("token")
+    return token ? { headers: { Authorization: `Bearer ${token}` } } : {}
+  }
+
   const fetchRoutes = async (page = pagination.page, limit = pagination.limit) => {
     try {
       setLoading(true)
@@ -345,7 +353,7 @@ export default function Routes_manages() {
       if (filterVehicleType !== "all") params.vehicle_type = filterVehicleType
       if (debouncedSearch.trim()) params.search = debouncedSearch.trim()
 
-      const response = await axios.get(`${API_BASE_URL}/routes`, { params })
+      const response = await axios.get(`${API_BASE_URL}/routes`, { ...authConfig(), params })
       const responseData = response.data
 
       // Support both paginated { data, pagination } and plain array responses
@@ -410,7 +418,7 @@ export default function Routes_manages() {
   const handleCreateRoute = async () => {
     try {
       setIsSubmitting(true)
-      await axios.post(`${API_BASE_URL}/routes`, buildPayload())
+      await axios.post(`${API_BASE_URL}/routes`, buildPayload(), authConfig())
       alert("Route created successfully")
       setIsCreateDialogOpen(false)
       setFormData(EMPTY_FORM)
@@ -427,7 +435,7 @@ export default function Routes_manages() {
     if (!selectedRoute) return
     try {
       setIsSubmitting(true)
-      await axios.put(`${API_BASE_URL}/routes/${selectedRoute.id}`, buildPayload())
+      await axios.put(`${API_BASE_URL}/routes/${selectedRoute.id}`, buildPayload(), authConfig())
       alert("Route updated successfully")
       setIsEditDialogOpen(false)
       setSelectedRoute(null)
@@ -445,7 +453,7 @@ export default function Routes_manages() {
     if (!selectedRoute) return
     try {
       setIsSubmitting(true)
-      await axios.delete(`${API_BASE_URL}/routes/${selectedRoute.id}`)
+      await axios.delete(`${API_BASE_URL}/routes/${selectedRoute.id}`, authConfig())
       alert("Route deleted successfully")
       setIsDeleteDialogOpen(false)
       setSelectedRoute(null)
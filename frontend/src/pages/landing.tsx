@@ -155,15 +155,32 @@ function VehicleIcon({ type, className = "h-8 w-8" }: { type: VehicleType; class
   return <img src={vehicle.icon} alt={vehicle.label} className={className} />
 }
 
+// --- Helper: GET that backs off when the API sheds load (429/503 + Retry-After) ---
+const MAX_RETRIES = 3
+
+async function getWithBackoff(url: string, params: Record<string, unknown>) {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await axios.get(url, { params })
+    } catch (err) {
+      const status = axios.isAxiosError(err) ? err.response?.status : undefined
+      if ((status !== 429 && status !== 503) || attempt >= MAX_RETRIES) throw err
+      const retryAfter = Number(axios.isAxiosError(err) ? err.response?.headers["retry-after"] : 0)
+      const delayMs = (retryAfter > 0 ? retryAfter * 1000 : 500 * 2 ** attempt) + Math.random() * 250
+      await new Promise(resolve => setTimeout(resolve, delayMs))
+    }
+  }
+}
+
 // --- Helper: fetch ALL routes for a vehicle type, handling pagination ---
 async function fetchAllRoutes(vehicle: VehicleType): Promise<Route[]> {
   const collected: Route[] = []
   let page = 1
-  const limit = 10 // large page to minimize round-trips
+  const limit = 100 // API maximum, to minimize round-trips
 
   while (true) {
-    const res = await axios.get(`${API_BASE_URL}/api/routes`, {
-      params: { vehicle_type: vehicle, page, limit },
+    const res = await getWithBackoff(`${API_BASE_URL}/api/routes`, {
+      vehicle_type: vehicle, page, limit,
     })
 
     const responseData = res.data